@@ -66,6 +66,10 @@ class Ui_hdf5gui(object):
         self.sweeps_check.setGeometry(QtCore.QRect(20, 130, 151, 17))
         self.sweeps_check.setChecked(True)
         self.sweeps_check.setObjectName("sweeps_check")
+        self.average_error_check = QtWidgets.QCheckBox(self.groupBox_2)
+        self.average_error_check.setGeometry(QtCore.QRect(110, 70, 171, 17))
+        self.average_error_check.setChecked(True)
+        self.average_error_check.setObjectName("average_error_check")
         self.convert_button = QtWidgets.QPushButton(self.groupBox_2)
         self.convert_button.setGeometry(QtCore.QRect(20, 160, 161, 41))
         self.convert_button.setStyleSheet("background-color: rgb(0, 255, 0);")
@@ -100,6 +104,7 @@ class Ui_hdf5gui(object):
         self.metadata_check.setText(_translate("hdf5gui", "metadata"))
         self.spectra_check.setText(_translate("hdf5gui", "probe, reference and error spectra for each sweep"))
         self.sweeps_check.setText(_translate("hdf5gui", "dT/T data for each sweep"))
+        self.average_error_check.setText(_translate("hdf5gui", "standard error of the average"))
         self.convert_button.setText(_translate("hdf5gui", "convert"))
         self.groupBox_3.setTitle(_translate("hdf5gui", "information"))
 
@@ -36,7 +36,7 @@ class Application(QtWidgets.QMainWindow):
         for index in range(self.ui.file_list.count()):
             filepath = self.ui.file_list.item(index).text()
             try:
-                f = h5py.File(filepath, 'r')
+                f = h5py.File(filepath, 'r', swmr=True)  # read-only, so files of runs still in progress can be converted too
                 self.files_dict[filepath] = f
                 self.write_console('loaded file <{0}>'.format(os.path.basename(os.path.normpath(filepath))))
             except(Exception):
@@ -110,6 +110,14 @@ class Application(QtWidgets.QMainWindow):
             self.write_console('saving averaged dT/T data to {0}'.format(str(fpath)))
             #np.savetxt(fpath, array, delimiter=',')
             np.savetxt(fpath.replace('.Dtc', '.csv'), array, delimiter=',')
+        if self.ui.average_error_check.isChecked():
+            if 'AverageError' in f:  # same layout as Average, nan where a time point has fewer than two sweeps
+                array = np.array(f['AverageError']).T
+                fpath = os.path.join(savedir, 'average_dTT_error.csv')
+                self.write_console('saving standard error of the averaged dT/T data to {0}'.format(str(fpath)))
+                np.savetxt(fpath, array, delimiter=',')
+            else:
+                self.write_console('no standard error of the average in <{0}>, skipping it'.format(fname))
         if self.ui.metadata_check.isChecked():
             array = np.array(f['Metadata'])
             g = f.get('Metadata')
@@ -122,24 +130,45 @@ class Application(QtWidgets.QMainWindow):
             newsavedir = self.mkdir(savedir, 'sweeps')
             wavelength = np.array(f['Average'])[0,1:]
             group = f['Spectra']
-            for spectrum_name in group.keys():
-                sweep, name = self.get_sweep(spectrum_name)
-                folder = self.mkdir(newsavedir, sweep)
-                spectrum = np.array(group[spectrum_name])
-                array = np.vstack((wavelength, spectrum)).T
-                fpath = os.path.join(folder, name)
-                self.write_console('saving spectrum to {0}'.format(fpath))
-                np.savetxt(fpath, array, delimiter=',')
+            if 'Probe' in group.keys():  # one (sweep x pixel) dataset per spectrum
+                for spectrum_name in ['Probe', 'Reference', 'Error']:
+                    spectra = np.array(group[spectrum_name])
+                    for index in range(spectra.shape[0]):
+                        folder = self.mkdir(newsavedir, 'Sweep_{0}'.format(index))
+                        array = np.vstack((wavelength, spectra[index])).T
+                        fpath = os.path.join(folder, '{0}_Spectrum.csv'.format(spectrum_name))
+                        self.write_console('saving spectrum to {0}'.format(fpath))
+                        np.savetxt(fpath, array, delimiter=',')
+            else:  # older files, one dataset per spectrum per sweep
+                for spectrum_name in group.keys():
+                    sweep, name = self.get_sweep(spectrum_name)
+                    folder = self.mkdir(newsavedir, sweep)
+                    spectrum = np.array(group[spectrum_name])
+                    array = np.vstack((wavelength, spectrum)).T
+                    fpath = os.path.join(folder, name)
+                    self.write_console('saving spectrum to {0}'.format(fpath))
+                    np.savetxt(fpath, array, delimiter=',')
         if self.ui.sweeps_check.isChecked():
             newsavedir = self.mkdir(savedir, 'sweeps')
-            group = f['Sweeps']
-            for sweep in group.keys():
-                folder = self.mkdir(newsavedir, sweep)
-                array = np.array(group[sweep]).T
-                fpath = os.path.join(folder, 'dTT.Dtc')
-                self.write_console('saving sweep dT/T data to {0}'.format(fpath))
-                #np.savetxt(fpath, array, delimiter=',')
-                np.savetxt(fpath.replace('.Dtc', '.csv'), array, delimiter=',')
+            if isinstance(f['Sweeps'], h5py.Dataset):  # one (sweep x time x pixel) dataset, read in one go
+                sweeps = np.array(f['Sweeps'])
+                header = np.hstack((0, np.array(f['Wavelengths'])))
+                times = np.array(f['Times'], ndmin=2).T
+                for index in range(sweeps.shape[0]):
+                    folder = self.mkdir(newsavedir, 'Sweep_{0}'.format(index))
+                    array = np.vstack((header, np.hstack((times, sweeps[index])))).T
+                    fpath = os.path.join(folder, 'dTT.Dtc')
+                    self.write_console('saving sweep dT/T data to {0}'.format(fpath))
+                    np.savetxt(fpath.replace('.Dtc', '.csv'), array, delimiter=',')
+            else:  # older files, one dataset per sweep
+                group = f['Sweeps']
+                for sweep in group.keys():
+                    folder = self.mkdir(newsavedir, sweep)
+                    array = np.array(group[sweep]).T
+                    fpath = os.path.join(folder, 'dTT.Dtc')
+                    self.write_console('saving sweep dT/T data to {0}'.format(fpath))
+                    #np.savetxt(fpath, array, delimiter=',')
+                    np.savetxt(fpath.replace('.Dtc', '.csv'), array, delimiter=',')
         f.close()
         self.write_console('finished file <{0}>'.format(fname))
 
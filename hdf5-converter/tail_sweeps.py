@@ -0,0 +1,43 @@
+"""
+follows a pyTA run while it is being measured, printing each sweep as soon as
+it is saved. the file is opened read-only in swmr mode, so nothing is copied
+and the run carries on undisturbed
+
+usage: python tail_sweeps.py <run.hdf5> [poll interval in seconds]
+"""
+import sys
+import time
+import h5py
+import numpy as np
+
+
+def tail_sweeps(filepath, interval=5, timeout=None):
+    """
+    yields (sweep index, times, wavelengths, dT/T of the sweep) for the sweeps
+    already in the file and then for each new one, until none has arrived for
+    timeout seconds (None to follow the file until interrupted). the file
+    appears with the first saved point of the run
+    """
+    with h5py.File(filepath, 'r', swmr=True) as f:
+        times = np.array(f['Times'])
+        waves = np.array(f['Wavelengths'])
+        sweeps = f['Sweeps']
+        timestamps = f['Sweep_Timestamps']  # one entry per finished sweep
+        next_sweep = 0
+        last_sweep_time = time.time()
+        while True:
+            timestamps.refresh()
+            sweeps.refresh()
+            while next_sweep < timestamps.shape[0]:
+                yield next_sweep, times, waves, sweeps[next_sweep]
+                next_sweep += 1
+                last_sweep_time = time.time()
+            if (timeout is not None) and (time.time()-last_sweep_time > timeout):
+                return
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    for sweep_index, times, waves, dtt in tail_sweeps(sys.argv[1], interval=interval):
+        print('sweep {0}: {1} time points x {2} pixels, max |dT/T| {3:.3e}'.format(sweep_index, times.size, waves.size, np.nanmax(np.abs(dtt))))
@@ -1,4 +1,5 @@
 import os
+import queue
 import ctypes as ct
 import numpy as np
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
@@ -6,25 +7,42 @@ from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
 
 class Acquisition(QObject):
     
-    def __init__(self, camera, number_of_scans=100, exposure_time_us=1):
+    def __init__(self, camera, number_of_scans=100, exposure_time_us=1, num_buffers=2, delay=None):
         super(QObject, self).__init__()
         self.camera = camera
-        self.camera.number_of_scans = number_of_scans
+        self.delay = delay  # if given, every shot block waits for the delay to finish moving first
         self.camera.exposure_time_us = exposure_time_us
-        self.camera.array = np.zeros((self.camera.number_of_scans+10, self.camera.pixels*2), dtype=np.dtype(np.int32))
-        #self.camera.data = self.camera.array[10:]
+        self.num_buffers = num_buffers  # size of the pool of shot blocks, 2 is enough for double buffering
+        self.update_number_of_scans(number_of_scans)
         
     def update_number_of_scans(self, number_of_scans):
+        """
+        (re)allocates the pool of shot blocks, only call while no blocks are checked out
+        """
         self.camera.number_of_scans = number_of_scans
-        self.camera.array = np.zeros((self.camera.number_of_scans+10, self.camera.pixels*2), dtype=np.dtype(np.int32))
-        #self.camera.data = self.camera.array[10:]
+        self.buffers = [np.zeros((self.camera.number_of_scans+10, self.camera.pixels*2), dtype=np.dtype(np.int32)) for i in range(self.num_buffers)]
+        self.free_buffers = queue.Queue()
+        for index in range(self.num_buffers):
+            self.free_buffers.put(index)
+        self.camera.array = self.buffers[0]
+        
+    def release_buffer(self, index):
+        """
+        hands a shot block back to the camera thread once the consumer has finished with it
+        """
+        self.free_buffers.put(index)
+        return
         
     start_acquire = pyqtSignal()
-    data_ready = pyqtSignal(np.ndarray, np.ndarray, int, int)
+    data_ready = pyqtSignal(np.ndarray, np.ndarray, int, int, int)
     @pyqtSlot()
     def acquire(self):
+        index = self.free_buffers.get()  # blocks until the consumer has returned a shot block
+        self.camera.array = self.buffers[index]
+        if self.delay is not None:
+            self.delay.wait_for_move()  # never take shots while the stage is still moving
         self.camera._acquire()
-        self.data_ready.emit(self.camera.probe, self.camera.reference, self.camera.first_pixel, self.camera.num_pixels)
+        self.data_ready.emit(self.camera.probe, self.camera.reference, self.camera.first_pixel, self.camera.num_pixels, index)
         self.camera.overflow = self.camera.FFOvl()
         return
 
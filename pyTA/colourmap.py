@@ -0,0 +1,140 @@
+import numpy as np
+import pyqtgraph as pg
+import pyqtgraph.functions as fn
+
+
+class RowImageItem(pg.ImageItem):
+    """
+    ImageItem that keeps its rendered ARGB buffer, so a single row of the
+    image can be recoloured on its own instead of rendering the whole image.
+    levels and lookup table changes still render everything
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.argb = None
+        super(RowImageItem, self).__init__(*args, **kwargs)
+
+    def current_lut(self):
+        if callable(self.lut):
+            return self.lut(self.image)
+        return self.lut
+
+    def render(self):
+        if self.image is None or self.image.size == 0:
+            return
+        self.argb, alpha = fn.makeARGB(self.display_image(self.image), lut=self.current_lut(), levels=self.levels)
+        self.qimage = fn.makeQImage(self.argb, alpha=True, copy=False, transpose=False)  # draws straight from self.argb
+        self._renderRequired = False  # flags newer pyqtgraph checks before painting
+        self._unrenderable = False
+        return
+
+    def display_image(self, image):
+        if self.axisOrder == 'col-major':
+            return image.transpose((1, 0, 2)[:image.ndim])
+        return image
+
+    def update_row(self, index):
+        """
+        recolours row index of the image after it was changed in place
+        """
+        if self.qimage is None or self.argb is None or self.argb.shape[:2] != self.display_image(self.image).shape[:2]:
+            self.qimage = None  # nothing to patch, render the lot
+            self._renderRequired = True
+        else:
+            row = self.image[index:index+1]
+            argb, alpha = fn.makeARGB(self.display_image(row), lut=self.current_lut(), levels=self.levels)
+            if self.axisOrder == 'col-major':
+                self.argb[:, index] = argb[:, 0]
+            else:
+                self.argb[index] = argb[0]
+        self.update()
+        return
+
+
+class ColourMapView(pg.ImageView):
+    """
+    ImageView for a time x pixel map that is filled one row at a time. the
+    image lives in a persistent buffer and set_row only recolours that row.
+    the autolevels come from the minimum and maximum of each row, so a new
+    row costs the same however many rows there are. the levels only move
+    when the data leaves them or fills less than half of them, which is
+    when the whole image is rendered again and the histogram redrawn
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('imageItem', RowImageItem(np.zeros((1, 1))))  # newer pyqtgraph shows the image of a given item straight away
+        super(ColourMapView, self).__init__(*args, **kwargs)
+        self.buffer = None
+        self.row_min = None
+        self.row_max = None
+        self.current_levels = None
+
+    def set_image(self, image, scale=None):
+        """
+        copies the whole image into the buffer and shows it, e.g. at the start of a run
+        """
+        image = np.asarray(image, dtype=float)
+        if self.buffer is None or self.buffer.shape != image.shape:
+            self.buffer = np.array(image)
+            self.row_min = np.full(image.shape[0], np.nan)
+            self.row_max = np.full(image.shape[0], np.nan)
+        else:
+            self.buffer[:] = image
+        for index in range(self.buffer.shape[0]):
+            self.update_row_levels(index)
+        self.current_levels = self.auto_levels()
+        self.setImage(self.buffer, autoLevels=False, levels=self.current_levels, scale=scale)
+        self.buffer = self.imageItem.image  # the array on screen, in case pyqtgraph copied it
+        return
+
+    def set_row(self, index, row):
+        """
+        updates one row of the image, renders everything only when the levels have to move
+        """
+        self.buffer[index] = row
+        self.update_row_levels(index)
+        if self.levels_stale():
+            self.current_levels = self.auto_levels()
+            self.setLevels(*self.current_levels)  # through the histogram, which renders the whole image
+            self.imageItem.sigImageChanged.emit()  # and redraws the histogram
+        else:
+            self.imageItem.update_row(index)
+        return
+
+    def update_row_levels(self, index):
+        row = self.buffer[index]
+        finite = row[np.isfinite(row)]
+        if finite.size > 0:
+            self.row_min[index] = finite.min()
+            self.row_max[index] = finite.max()
+        else:
+            self.row_min[index] = np.nan
+            self.row_max[index] = np.nan
+        return
+
+    def data_range(self):
+        if np.all(np.isnan(self.row_min)):
+            return None
+        return np.nanmin(self.row_min), np.nanmax(self.row_max)
+
+    def auto_levels(self):
+        """
+        range of all rows with a 5% margin, (0, 1) while the image is empty
+        """
+        data_range = self.data_range()
+        if data_range is None:
+            return (0.0, 1.0)
+        low, high = data_range
+        margin = 0.05*(high-low)
+        if margin == 0:
+            margin = max(abs(high), 1e-12)
+        return (low-margin, high+margin)
+
+    def levels_stale(self):
+        data_range = self.data_range()
+        if data_range is None:
+            return False
+        if self.current_levels is None:
+            return True
+        low, high = self.current_levels
+        return (data_range[0] < low) or (data_range[1] > high) or (data_range[1]-data_range[0] < 0.5*(high-low))
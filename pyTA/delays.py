@@ -31,11 +31,22 @@ class PILongStageDelay:
         return    
         
     def move_to(self, time_point_ps):
+        tau_flip_request = self.start_move(time_point_ps)
+        self.wait_for_move()
+        return tau_flip_request
+    
+    def start_move(self, time_point_ps):
+        """
+        sends the MOV without waiting, so the next point can be processed while the stage travels
+        """
         new_pos_mm = self.convert_ps_to_mm(float(self.t0-time_point_ps))
         self.stage.MOV(self.axis, new_pos_mm)
-        self.wait(self.timeout)
         return True  # since chopper REF signal is out of phase
     
+    def wait_for_move(self):
+        self.wait(self.timeout)
+        return
+    
     def convert_ps_to_mm(self, time_ps):
         pos_mm = 0.299792458*time_ps/2
         return pos_mm
@@ -96,11 +107,22 @@ class PIShortStageDelay:
         return    
         
     def move_to(self, time_point_ps):
+        tau_flip_request = self.start_move(time_point_ps)
+        self.wait_for_move()
+        return tau_flip_request
+    
+    def start_move(self, time_point_ps):
+        """
+        sends the MOV without waiting, so the next point can be processed while the stage travels
+        """
         new_pos_mm = self.convert_ps_to_mm(float(self.t0-time_point_ps))
         self.stage.MOV(self.axis, new_pos_mm)
-        self.wait(self.timeout)
         return True  # since chopper REF signal is out of phase
     
+    def wait_for_move(self):
+        self.wait(self.timeout)
+        return
+    
     def convert_ps_to_mm(self, time_ps):
         pos_mm = (0.299792458*time_ps/2)-13.0
         return pos_mm
@@ -168,6 +190,12 @@ class InnolasPinkLaserDelay:
         self.dg.write('DLAY 2,0,{0:.5e}\r'.format(new_time))  # delay channel AB by new_time seconds from channel T0
         return tau_flip_request
     
+    def start_move(self, time_point_ns):
+        return self.move_to(time_point_ns)
+    
+    def wait_for_move(self):
+        return  # the new delay applies from the next trigger, nothing moves
+    
     def set_max_min_times(self):
         self.tmax = 1E6+self.t0
         self.tmin = -1E6+self.t0
@@ -2,24 +2,142 @@ import datetime
 import numpy as np
 
 
+class RunningStatistics:
+    """
+    single pass mean and variance along the shot axis, fed with blocks of
+    shots (Welford's algorithm, with blocks merged by Chan's parallel update).
+    the running totals are always float64, whatever the block precision.
+    the mean and std are nan until the first shot, so a point without any
+    shot pairs fails check_dtt instead of passing as zero
+    """
+    
+    def __init__(self, num_pixels):
+        self.count = 0
+        self.mean = np.full(num_pixels, np.nan)
+        self.m2 = np.zeros(num_pixels)
+        
+    def add(self, block, scratch=None):
+        block_count = block.shape[0]
+        if block_count == 0:
+            return
+        block_mean = block.mean(axis=0)
+        deviation = np.subtract(block, block_mean, out=scratch)
+        block_m2 = np.square(deviation, out=deviation).sum(axis=0)
+        if self.count == 0:
+            self.mean = np.array(block_mean, dtype=float)
+            self.m2 = np.array(block_m2, dtype=float)
+            self.count = block_count
+            return
+        count = self.count+block_count
+        delta = block_mean-self.mean
+        self.mean = self.mean+delta*(block_count/count)
+        self.m2 = self.m2+block_m2+delta**2*(self.count*block_count/count)
+        self.count = count
+        return
+        
+    def std(self):
+        """
+        population standard deviation, same as np.std(..., axis=0)
+        """
+        if self.count == 0:
+            return np.full(self.m2.shape, np.nan)
+        return np.sqrt(self.m2/self.count)
+
+
+class Workspace:
+    """
+    preallocated shot matrices for DataProcessing, sized once per run so that
+    every point is processed in place instead of allocating new arrays
+    """
+    
+    def __init__(self, num_shots, num_pixels, block_size=500, dtype=np.float64):
+        self.block_size = block_size
+        self.dtype = dtype  # np.float32 halves the working set, see check_precision
+        self.allocate(num_shots, num_pixels)
+        
+    def allocate(self, num_shots, num_pixels):
+        num_pairs = num_shots//2
+        self.num_shots = num_shots
+        self.num_pixels = num_pixels
+        self.probe = np.empty((num_shots, num_pixels), dtype=self.dtype)
+        self.reference = np.empty((num_shots, num_pixels), dtype=self.dtype)
+        self.probe_on = np.empty((num_pairs, num_pixels), dtype=self.dtype)
+        self.probe_off = np.empty((num_pairs, num_pixels), dtype=self.dtype)
+        self.reference_on = np.empty((num_pairs, num_pixels), dtype=self.dtype)
+        self.reference_off = np.empty((num_pairs, num_pixels), dtype=self.dtype)
+        self.interp_left = np.empty((num_pairs, num_pixels), dtype=self.dtype)  # neighbours for the reference manipulation
+        self.interp_right = np.empty((num_pairs, num_pixels), dtype=self.dtype)
+        self.blocks = [np.empty((self.block_size, num_pixels), dtype=self.dtype) for i in range(5)]  # scratch for calculate_dtt_streaming
+        
+    def fit(self, num_shots, num_pixels):
+        """
+        only reallocates if the shot block has changed shape, e.g. a new run
+        with a different number of shots
+        """
+        if (num_shots != self.num_shots) or (num_pixels != self.num_pixels):
+            self.allocate(num_shots, num_pixels)
+        return
+
+
 class DataProcessing:
 
-    def __init__(self, probe_array, reference_array, first_pixel, num_pixels):
+    def __init__(self, probe_array, reference_array, first_pixel, num_pixels, workspace=None, dtype=np.float64):
+        self.dtype = dtype if workspace is None else workspace.dtype
         self.untrimmed_probe_array = np.array(probe_array, dtype=int)
-        self.probe_array = np.array(probe_array, dtype=float)[:, first_pixel:num_pixels+first_pixel]
-        self.reference_array = np.array(reference_array, dtype=float)[:, first_pixel:num_pixels+first_pixel]
-        self.raw_probe_array = np.array(probe_array, dtype=float)[:, first_pixel:num_pixels+first_pixel]
-        self.raw_reference_array = np.array(reference_array, dtype=float)[:, first_pixel:num_pixels+first_pixel]
+        self.probe_array = np.array(probe_array, dtype=self.dtype)[:, first_pixel:num_pixels+first_pixel]
+        self.reference_array = np.array(reference_array, dtype=self.dtype)[:, first_pixel:num_pixels+first_pixel]
+        self.raw_probe_array = np.array(probe_array, dtype=self.dtype)[:, first_pixel:num_pixels+first_pixel]
+        self.raw_reference_array = np.array(reference_array, dtype=self.dtype)[:, first_pixel:num_pixels+first_pixel]
         self.first_pixel = first_pixel
         self.num_pixels = num_pixels
+        self.refman_key = None
+        self.workspace = workspace
+        if self.workspace is not None:
+            self.update(probe_array, reference_array, first_pixel, num_pixels)
         
     def update(self, probe_array, reference_array, first_pixel, num_pixels):
         self.untrimmed_probe_array = probe_array
         self.probe_array = probe_array[:, first_pixel:num_pixels+first_pixel]
         self.reference_array = reference_array[:, first_pixel:num_pixels+first_pixel]
+        if self.workspace is not None:
+            self.workspace.fit(probe_array.shape[0], num_pixels)
+            self.probe_array = self.to_workspace(self.probe_array, self.workspace.probe)
+            self.reference_array = self.to_workspace(self.reference_array, self.workspace.reference)
+        else:
+            self.probe_array = self.probe_array.astype(self.dtype)  # the raw counts are integers, the stages work in place on floats
+            self.reference_array = self.reference_array.astype(self.dtype)
         self.first_pixel = first_pixel
         self.num_pixels = num_pixels
         
+    @staticmethod
+    def to_workspace(array, out):
+        np.copyto(out, array)
+        return out
+        
+    def scratch(self, index, num_shots):
+        """
+        block of scratch space from the workspace, None (i.e. allocate) without one
+        """
+        if self.workspace is None:
+            return None
+        return self.workspace.blocks[index][:num_shots]
+        
+    def process(self, threshold, tau_flip_request=False, linear_corr=None, bgd=None, refman=None, use_reference=True, use_avg_off_shots=True, cutoff=[0, 100], max_dtt=1):
+        """
+        the whole per-point pipeline, leave linear_corr, bgd or refman as None
+        to skip that stage. returns the high_std and high_dtt quality flags
+        """
+        if linear_corr is not None:
+            self.linear_pixel_correlation(linear_corr)
+        high_std = self.separate_on_off(threshold, tau_flip_request)
+        if bgd is not None:
+            self.sub_bgd(bgd)
+        if refman is not None:
+            self.manipulate_reference(refman)
+        self.average_shots()
+        high_dtt = self.calculate_dtt_streaming(use_reference=use_reference, cutoff=cutoff, use_avg_off_shots=use_avg_off_shots, max_dtt=max_dtt)
+        return high_std, high_dtt
+        
     def set_linear_pixel_correlation(self):
         """
         only necessary for NIR cameras
@@ -36,34 +154,81 @@ class DataProcessing:
         """
         only necessary for NIR cameras
         """
-        self.probe_array = self.probe_array/linear_corr[0]
-        self.reference_array = self.reference_array/linear_corr[1]
+        if self.workspace is not None:
+            np.divide(self.probe_array, linear_corr[0], out=self.probe_array)
+            np.divide(self.reference_array, linear_corr[1], out=self.reference_array)
+        else:
+            self.probe_array = self.probe_array/linear_corr[0]
+            self.reference_array = self.reference_array/linear_corr[1]
         return
         
     def separate_on_off(self, threshold, tau_flip_request=False):
+        high_std, on_index, off_index = self.find_pairs(threshold, tau_flip_request)
+        if self.workspace is not None:
+            num_pairs = on_index.size
+            self.probe_on_array = np.take(self.probe_array, on_index, axis=0, out=self.workspace.probe_on[:num_pairs], mode='clip')  # indices are always valid, clip avoids a buffered copy
+            self.probe_off_array = np.take(self.probe_array, off_index, axis=0, out=self.workspace.probe_off[:num_pairs], mode='clip')
+            self.reference_on_array = np.take(self.reference_array, on_index, axis=0, out=self.workspace.reference_on[:num_pairs], mode='clip')
+            self.reference_off_array = np.take(self.reference_array, off_index, axis=0, out=self.workspace.reference_off[:num_pairs], mode='clip')
+        else:
+            self.probe_on_array = self.probe_array[on_index, :]
+            self.probe_off_array = self.probe_array[off_index, :]
+            self.reference_on_array = self.reference_array[on_index, :]
+            self.reference_off_array = self.reference_array[off_index, :]
+        return high_std
+    
+    def find_pairs(self, threshold, tau_flip_request=False):
+        """
+        reads the trigger pixel, classifies and pairs the shots, returns the
+        high_std flag and the indices of the on and off shot of each pair.
+        the shots left without a partner are counted in num_dropped_shots,
+        for the caller to report
+        """
         high_std = False
-        pixel = threshold[0]
-        thresh_value = threshold[1]
-        self.trigger = []
-        for shot in self.untrimmed_probe_array:
-            self.trigger.append(shot[pixel])
-        self.trigger = np.array(self.trigger)
-        if np.abs(self.trigger-self.trigger.mean()).std() > 20:
+        trigger = self.untrimmed_probe_array[:, threshold[0]].astype(float)
+        if np.abs(trigger-trigger.mean()).std() > 20:
             print('high std '+str(datetime.datetime.now()))
             #high_std = True
+        self.chopper_state = self.classify_shots(trigger, threshold[1], tau_flip_request)
+        self.trigger = np.roll(trigger, 1) if tau_flip_request is True else trigger
+        on_index, off_index = self.pair_shots(self.chopper_state)
+        self.num_pairs = on_index.size
+        self.num_dropped_shots = self.chopper_state.size-2*self.num_pairs
+        return high_std, on_index, off_index
+    
+    @staticmethod
+    def classify_shots(trigger, thresh_value, tau_flip_request=False):
+        """
+        per-shot chopper state (True is pump on) from the trigger pixel, makes
+        no assumption of strict alternation. a tau flip means the pump arrives
+        one shot late, which inverts the state
+        """
+        chopper_state = trigger >= thresh_value
         if tau_flip_request is True:
-            self.trigger = np.roll(self.trigger, 1)
-        if (self.untrimmed_probe_array[0, pixel] >= thresh_value and not tau_flip_request) or (self.untrimmed_probe_array[0, pixel] < thresh_value and tau_flip_request):
-            self.probe_on_array = self.probe_array[::2,:]
-            self.probe_off_array = self.probe_array[1::2,:]
-            self.reference_on_array = self.reference_array[::2,:]
-            self.reference_off_array = self.reference_array[1::2,:]
-        else:
-            self.probe_on_array = self.probe_array[1::2,:]
-            self.probe_off_array = self.probe_array[::2,:]
-            self.reference_on_array = self.reference_array[1::2,:]
-            self.reference_off_array = self.reference_array[::2,:]
-        return high_std
+            chopper_state = ~chopper_state
+        return chopper_state
+    
+    @staticmethod
+    def pair_shots(chopper_state):
+        """
+        pairs each pump on shot with its neighbouring pump off shot
+           1. Splits the shots into runs of strictly alternating chopper state,
+              a new run starts wherever two neighbouring shots share a state
+              (e.g. a dropped trigger)
+           2. Pairs shots (0,1), (2,3)... counted from the start of each run
+           3. Drops the odd shot left at the end of a run
+        returns the indices of the on and off shot in each pair
+        """
+        num_shots = chopper_state.size
+        shot_index = np.arange(num_shots)
+        alternates = chopper_state[1:] != chopper_state[:-1]
+        run_start = np.zeros(num_shots, dtype=int)
+        run_start[1:][~alternates] = shot_index[1:][~alternates]
+        run_start = np.maximum.accumulate(run_start)
+        first = np.flatnonzero((((shot_index-run_start) % 2) == 0)[:-1] & alternates)
+        on_index = np.where(chopper_state[first], first, first+1)
+        off_index = np.where(chopper_state[first], first+1, first)
+        return on_index, off_index
         
     def average_shots(self):
         self.probe_on = self.probe_on_array.mean(axis=0)
@@ -71,12 +236,24 @@ class DataProcessing:
         self.reference_on = self.reference_on_array.mean(axis=0)
         self.reference_off = self.reference_off_array.mean(axis=0)
         return
+    
+    def on_shot_std(self):
+        """
+        spread of the pump on probe and reference shots, for the diagnostics plot
+        """
+        return np.std(self.probe_on_array, axis=0), np.std(self.reference_on_array, axis=0)
         
     def sub_bgd(self, bgd):
-        self.probe_on_array = self.probe_on_array - bgd.probe_on
-        self.probe_off_array = self.probe_off_array - bgd.probe_off
-        self.reference_on_array = self.reference_on_array - bgd.reference_on
-        self.reference_off_array = self.reference_off_array - bgd.reference_off
+        if self.workspace is not None:
+            np.subtract(self.probe_on_array, bgd.probe_on, out=self.probe_on_array)
+            np.subtract(self.probe_off_array, bgd.probe_off, out=self.probe_off_array)
+            np.subtract(self.reference_on_array, bgd.reference_on, out=self.reference_on_array)
+            np.subtract(self.reference_off_array, bgd.reference_off, out=self.reference_off_array)
+        else:
+            self.probe_on_array = self.probe_on_array - bgd.probe_on
+            self.probe_off_array = self.probe_off_array - bgd.probe_off
+            self.reference_on_array = self.reference_on_array - bgd.reference_on
+            self.reference_off_array = self.reference_off_array - bgd.reference_off
         return
         
     def manipulate_reference(self, refman):
@@ -89,19 +266,49 @@ class DataProcessing:
            5. Adds a fixed horizontal offset
            6. Interpolates the Y values mapped onto the ajusted horizontal
               axis back onto an unmodified axis, to fit the probe spectra
+        the interpolation is the same for every shot, so it is applied to all
+        shots at once using the indices and weights from set_refman_interp
         """
         vs, vo, ho, sc, sf = refman
         if vs <= 0:
             vs = 1
+        self.set_refman_interp(ho, sc, sf)
+        if self.workspace is not None:
+            for reference_array in (self.reference_off_array, self.reference_on_array):
+                num_pairs = reference_array.shape[0]
+                left = np.take(reference_array, self.refman_index, axis=1, out=self.workspace.interp_left[:num_pairs], mode='clip')
+                right = np.take(reference_array, self.refman_index+1, axis=1, out=self.workspace.interp_right[:num_pairs], mode='clip')
+                np.subtract(right, left, out=right)
+                np.multiply(right, self.refman_weight, out=right)
+                np.add(left, right, out=reference_array)
+                np.multiply(reference_array, vs, out=reference_array)
+                np.add(reference_array, vo, out=reference_array)
+        else:
+            self.reference_off_array = self.interp_reference(self.reference_off_array)*vs+vo
+            self.reference_on_array = self.interp_reference(self.reference_on_array)*vs+vo
+        return
+    
+    def set_refman_interp(self, ho, sc, sf):
+        """
+        precomputes the linear interpolation onto the manipulated axis, only
+        rebuilt when the horizontal refman settings or pixel number change
+        """
         if sf <= 0:
             sf = 1
+        key = (ho, sc, sf, self.num_pixels)
+        if self.refman_key == key:
+            return
         x = np.linspace(0,self.num_pixels-1, self.num_pixels)
         new_x = ((x-sc)*sf)+sc-ho
-        for i, spectra in enumerate(self.reference_off_array):
-            self.reference_off_array[i] = np.interp(new_x, x, spectra*vs+vo)
-        for i, spectra in enumerate(self.reference_on_array):
-            self.reference_on_array[i] = np.interp(new_x, x, spectra*vs+vo)
+        self.refman_index = np.clip(np.floor(new_x), 0, self.num_pixels-2).astype(int)  # left neighbour, clipped like np.interp at the edges
+        self.refman_weight = np.clip(new_x-self.refman_index, 0, 1).astype(self.dtype)
+        self.refman_key = key
         return
+    
+    def interp_reference(self, reference_array):
+        left = reference_array[:, self.refman_index]
+        right = reference_array[:, self.refman_index+1]
+        return left+(right-left)*self.refman_weight
         
     def correct_probe_with_reference(self):
         self.refd_probe_on_array = self.probe_on_array/self.reference_on_array
@@ -114,7 +321,6 @@ class DataProcessing:
         return
         
     def calcuate_dtt(self, use_reference=False, cutoff=[0, 100], use_avg_off_shots=True, max_dtt=1):
-        high_dtt = False
         if use_reference is True:
             if use_avg_off_shots is True:
                 self.dtt_array = (self.refd_probe_on_array-self.refd_probe_off_array)/self.refd_probe_off
@@ -126,6 +332,11 @@ class DataProcessing:
             if use_avg_off_shots is False:
                 self.dtt_array = (self.probe_on_array-self.probe_off_array)/self.probe_off_array
         self.dtt = self.dtt_array.mean(axis=0)
+        high_dtt = self.check_dtt(cutoff, max_dtt)
+        return high_dtt
+    
+    def check_dtt(self, cutoff, max_dtt):
+        high_dtt = False
         fin_dtt = self.dtt[np.isfinite(self.dtt)]
         if fin_dtt.size == 0 or np.abs(fin_dtt[cutoff[0]:cutoff[1]]).max() > max_dtt:
             high_dtt = True
@@ -144,4 +355,101 @@ class DataProcessing:
         if use_reference is False:
             self.probe_shot_error = np.std(2*(self.probe_on_array-self.probe_off_array)/(self.probe_on_array+self.probe_off_array), axis=0)
         return
-        
\ No newline at end of file
+    
+    def calculate_dtt_streaming(self, use_reference=False, cutoff=[0, 100], use_avg_off_shots=True, max_dtt=1, block_size=500):
+        """
+        same results as correct_probe_with_reference, average_refd_shots,
+        calcuate_dtt and calculate_dtt_error, but the shots are fed through
+        RunningStatistics a block at a time so the per-shot refd and dtt
+        arrays are never held in full. needs average_shots first. when the
+        referenced dtt is divided by the average off shot a second pass is
+        made, as that average is only known once every block has been seen.
+        with a workspace the blocks are written into its scratch space
+        """
+        if self.workspace is not None:
+            block_size = self.workspace.block_size
+        num_shots = self.probe_on_array.shape[0]
+        blocks = [slice(start, start+block_size) for start in range(0, num_shots, block_size)]
+        dtt_stats = RunningStatistics(self.num_pixels)
+        probe_error_stats = RunningStatistics(self.num_pixels)
+        if use_reference is True:
+            refd_on_stats = RunningStatistics(self.num_pixels)
+            refd_off_stats = RunningStatistics(self.num_pixels)
+            ref_error_stats = RunningStatistics(self.num_pixels)
+            for block in blocks:
+                probe_on, probe_off = self.probe_on_array[block], self.probe_off_array[block]
+                reference_on, reference_off = self.reference_on_array[block], self.reference_off_array[block]
+                n = probe_on.shape[0]
+                refd_probe_on = np.divide(probe_on, reference_on, out=self.scratch(0, n))
+                refd_probe_off = np.divide(probe_off, reference_off, out=self.scratch(1, n))
+                refd_on_stats.add(refd_probe_on, scratch=self.scratch(4, n))
+                refd_off_stats.add(refd_probe_off, scratch=self.scratch(4, n))
+                if use_avg_off_shots is True:
+                    probe_error_stats.add(self.shot_error(probe_on, probe_off, self.probe_on+self.probe_off, n), scratch=self.scratch(4, n))
+                    ref_error_stats.add(self.shot_error(reference_on, self.reference_off, np.add(reference_on, self.reference_off, out=self.scratch(3, n)), n), scratch=self.scratch(4, n))
+                else:
+                    probe_error_stats.add(self.shot_error(probe_on, probe_off, np.add(probe_on, probe_off, out=self.scratch(3, n)), n), scratch=self.scratch(4, n))
+                    ref_error_stats.add(self.shot_error(reference_on, reference_off, np.add(reference_on, reference_off, out=self.scratch(3, n)), n), scratch=self.scratch(4, n))
+                    dtt_stats.add(self.shot_dtt(refd_probe_on, refd_probe_off, refd_probe_off, n), scratch=self.scratch(4, n))
+            self.refd_probe_on = refd_on_stats.mean
+            self.refd_probe_off = refd_off_stats.mean
+            if use_avg_off_shots is True:
+                for block in blocks:
+                    n = self.probe_on_array[block].shape[0]
+                    refd_probe_on = np.divide(self.probe_on_array[block], self.reference_on_array[block], out=self.scratch(0, n))
+                    refd_probe_off = np.divide(self.probe_off_array[block], self.reference_off_array[block], out=self.scratch(1, n))
+                    dtt_stats.add(self.shot_dtt(refd_probe_on, refd_probe_off, self.refd_probe_off, n), scratch=self.scratch(4, n))
+            self.ref_shot_error = ref_error_stats.std()
+            self.dtt_error = refd_off_stats.std()
+        else:
+            for block in blocks:
+                probe_on, probe_off = self.probe_on_array[block], self.probe_off_array[block]
+                n = probe_on.shape[0]
+                if use_avg_off_shots is True:
+                    dtt_stats.add(self.shot_dtt(probe_on, probe_off, self.probe_off, n), scratch=self.scratch(4, n))
+                else:
+                    dtt_stats.add(self.shot_dtt(probe_on, probe_off, probe_off, n), scratch=self.scratch(4, n))
+                probe_error_stats.add(self.shot_error(probe_on, probe_off, np.add(probe_on, probe_off, out=self.scratch(3, n)), n), scratch=self.scratch(4, n))
+        self.dtt = dtt_stats.mean
+        self.probe_shot_error = probe_error_stats.std()
+        high_dtt = self.check_dtt(cutoff, max_dtt)
+        return high_dtt
+    
+    def shot_dtt(self, on, off, norm, num_shots):
+        """
+        (on-off)/norm for a block of shots
+        """
+        dtt = np.subtract(on, off, out=self.scratch(2, num_shots))
+        return np.divide(dtt, norm, out=dtt)
+    
+    def shot_error(self, on, off, on_plus_off, num_shots):
+        """
+        2*(on-off)/(on+off) for a block of shots
+        """
+        error = np.subtract(on, off, out=self.scratch(2, num_shots))
+        np.multiply(error, 2, out=error)
+        return np.divide(error, on_plus_off, out=error)
+
+
+def check_precision(probe_array, reference_array, first_pixel, num_pixels, threshold, processing_class=DataProcessing, **options):
+    """
+    accuracy check of the float32 path against float64. runs one shot block
+    through processing_class.process at both precisions, with the options of
+    the run, and returns the largest difference in dtt, both absolute and
+    relative to the shot noise limited error of the mean (probe_shot_error
+    over root number of pairs). a relative value well below 1 means float32
+    makes no measurable difference to the data. nan when no pixel compares
+    """
+    options['max_dtt'] = np.inf
+    results = []
+    for dtype in (np.float64, np.float32):
+        data = processing_class(probe_array, reference_array, first_pixel, num_pixels, dtype=dtype)
+        data.process(threshold, **options)
+        results.append(data)
+    difference = np.abs(results[1].dtt-results[0].dtt)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        noise = results[0].probe_shot_error/np.sqrt(results[0].num_pairs)
+    finite = np.isfinite(difference) & np.isfinite(noise) & (noise > 0)
+    if not finite.any():
+        return np.nan, np.nan
+    return difference[finite].max(), (difference[finite]/noise[finite]).max()
@@ -0,0 +1,636 @@
+"""
+runs measurements without the gui
+
+usage: python engine.py <run config.json>
+
+the config is a json object for one run, or {"jobs": [...], "defaults": {...}}
+for a queue of runs one after another, each job a run config on top of the
+defaults. all keys but times and filepath are optional:
+    name                shown in the progress of a queue, default the file name
+    times               list of delay times, or a path to a .tf time file
+    filepath            hdf5 file of the run
+    num_sweeps          default 1
+    num_shots           shots per time point, default 1000
+    dcshotfactor        background shots as a multiple of num_shots, default 1
+    test_run            true to skip the background and saving, default false
+    camera              'VIS' or 'NIR', default 'VIS'
+    delay               'Long Stage', 'Short Stage' or 'Pink Laser', default 'Long Stage'
+    t0                  time zero of the delay, default 0
+    simulate            true to use the simulated camera and delay, default false
+    calib               [pixel low, pixel high, wavelength low, wavelength high], default pixel numbers
+    threshold           [trigger pixel, trigger value], default [0, 15000]
+    use_reference, use_avg_off_shots    default true
+    cutoff              [first pixel, last pixel] checked against max_dtt, default all pixels
+    max_dtt             default 1
+    precision           'float64' or 'float32', default 'float64'. float32 only
+                        applies without numba, the precision used is saved
+    metadata            anything else to save with the run
+    reuse_background    take the background of the previous job if nothing it
+                        depends on has changed, default true
+camera and simulate are the same for every job of a queue
+"""
+import sys
+import os
+import json
+import datetime
+from collections import deque
+import numpy as np
+from PyQt5 import QtCore
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from dtt import DataProcessing
+from fused import processing_dtype
+from processing import Processing
+from sweeps import SweepProcessing
+from cameras import Acquisition
+
+
+class MeasurementEngine(QObject):
+    """
+    the run state machine of pyTA without any widgets: background, sweeps,
+    time points, retakes and saving. lives in the thread that starts it (the
+    gui thread, or the main thread of a script) and drives the camera and
+    processing threads through signals. the gui and the command line runner
+    hand it a config and follow the run through its signals.
+
+    config keys: times, num_sweeps, num_shots, dcshotfactor, filepath,
+    metadata, waves, test_run, and processing, the dict of threshold,
+    linear_corr, refman, use_reference, use_avg_off_shots, cutoff, max_dtt
+    and dtype passed on to the processing thread with every point
+    """
+
+    def __init__(self, camera, delay, config, acquisition=None):
+        super(QObject, self).__init__()
+        self.camera = camera
+        self.delay = delay
+        self.config = config
+        self.acquisition = acquisition  # shared with other runs if given, with its thread and start_acquire already connected
+        self.times = np.asarray(config['times'])
+        self.num_sweeps = config['num_sweeps']
+        self.stop_request = False
+        self.tau_flip_request = False
+        self.target_time = None
+        self.bgd = None
+        self.resumed_sweep = None
+        self.first_timestep = 0
+        self.sweep_index = 0
+        self.timestep = 0
+        self.pending = deque()  # time points of the sweep still to be requested, retakes go back in at the front
+        self.in_flight = 0  # shot blocks requested from the camera whose point has not come back yet
+        self.reading_out = False  # a shot block is requested and not read out yet, the camera takes one request at a time
+        self.acquire_thread = None
+        self.processing_thread = None
+        self.hold_after_background = False  # leave run() to the owner once the background is in, e.g. to unblock the beams first
+
+    message = pyqtSignal(str)
+    background_started = pyqtSignal()
+    def start(self, resumed_sweep=None, first_timestep=0, bgd=None):
+        """
+        takes the background (not for a test run, nor if bgd is given), then
+        runs every sweep. resumed_sweep and first_timestep carry on a run from
+        SweepProcessing.resume
+        """
+        self.stop_request = False
+        self.resumed_sweep = resumed_sweep
+        self.first_timestep = first_timestep
+        if self.acquisition is None:
+            self.acquire_thread = QtCore.QThread()
+            self.acquire_thread.start()
+            
+            self.acquisition = Acquisition(self.camera, number_of_scans=self.config['num_shots']*self.config['dcshotfactor'], delay=self.delay)
+            
+            self.acquisition.moveToThread(self.acquire_thread)
+            self.acquisition.start_acquire.connect(self.acquisition.acquire)
+        else:
+            self.acquire_thread = None
+            self.acquisition.delay = self.delay
+            self.acquisition.update_number_of_scans(self.config['num_shots']*self.config['dcshotfactor'])
+        self.acquisition.data_ready.connect(self.post_acquire_bgd)
+
+        if (bgd is not None) and (self.config['test_run'] is False):
+            self.message.emit('Reusing the previous background')
+            self.bgd = bgd
+            self.run()
+        elif self.config['test_run'] is False:
+            self.background_started.emit()
+            self.message.emit('Taking Background')
+            self.message.emit('Acquiring '+str(self.config['num_shots']*self.config['dcshotfactor'])+' shots')
+            self.acquisition.start_acquire.emit()
+        else:
+            self.run()
+        return
+
+    background_taken = pyqtSignal()
+    @pyqtSlot(np.ndarray, np.ndarray, int, int, int)
+    def post_acquire_bgd(self, probe, reference, first_pixel, num_pixels, buffer_index):
+        self.background_taken.emit()
+        processing = self.config['processing']
+        self.bgd = DataProcessing(probe,
+                                  reference,
+                                  first_pixel,
+                                  num_pixels,
+                                  dtype=processing['dtype'])
+        self.acquisition.release_buffer(buffer_index)
+        if processing['linear_corr'] is not None:
+            try:
+                self.bgd.linear_pixel_correlation(processing['linear_corr'])
+            except:
+                self.message.emit('Error using linear pixel correction on the background')
+        self.bgd.separate_on_off(processing['threshold'])
+        self.bgd.average_shots()
+        if self.hold_after_background is False:
+            self.run()
+        return
+
+    run_started = pyqtSignal(object)
+    def run(self):
+        if self.resumed_sweep is None:
+            current_sweep = SweepProcessing(self.times, self.camera.num_pixels, self.config['filepath'], self.config['metadata'], waves=self.config['waves'], swmr=True)
+        else:
+            current_sweep = self.resumed_sweep
+            self.resumed_sweep = None
+        self.sweep_index = current_sweep.sweep_index
+        self.target_time = None
+        self.run_started.emit({'sweep_index': current_sweep.sweep_index,
+                               'sweep_data': np.array(current_sweep.current_data),
+                               'avg_data': np.array(current_sweep.avg_data),
+                               'avg_error': current_sweep.avg_error(),
+                               'hdf5_filename': current_sweep.hdf5_filename})
+
+        self.acquisition.update_number_of_scans(self.config['num_shots'])
+        self.processing_thread = QtCore.QThread()
+        self.processing_thread.start()
+
+        self.processing = Processing(self.acquisition)
+
+        self.processing.moveToThread(self.processing_thread)
+        self.processing_thread.finished.connect(self.processing.close, QtCore.Qt.DirectConnection)
+        self.processing.settings_changed.connect(self.processing.update_settings)
+        self.processing.start_run.connect(self.processing.new_run)
+        self.processing.start_next_sweep.connect(self.processing.next_sweep)
+        self.processing.start_run.emit(current_sweep)
+        self.processing.point_ready.connect(self.post_acquire)
+        self.processing.sweep_ready.connect(self.post_save_sweep)
+        self.processing.write_failed.connect(self.write_failed)
+        self.processing.message.connect(self.message)
+        self.acquisition.data_ready.disconnect(self.post_acquire_bgd)
+        self.acquisition.data_ready.connect(self.processing.process)
+        self.acquisition.data_ready.connect(self.post_readout)
+
+        self.message.emit('Starting Sweep '+str(self.sweep_index))
+        self.start_sweep(self.first_timestep, measured=np.array(current_sweep.measured))
+        return
+
+    def processing_settings(self, time_point=None):
+        settings = dict(self.config['processing'])
+        settings.update({'tau_flip_request': self.tau_flip_request,
+                         'bgd': None if self.config['test_run'] is True else self.bgd,
+                         'time_point': time_point,
+                         'save': self.config['test_run'] is False})
+        return settings
+
+    def start_sweep(self, first_timestep=0, measured=None):
+        """
+        measured marks the time points of a resumed sweep already in its file
+        """
+        self.pending = deque(timestep for timestep in range(first_timestep, self.times.size) if (measured is None) or (measured[timestep] == False))
+        self.acquire()
+        return
+
+    point_started = pyqtSignal(int, int)
+    def acquire(self):
+        """
+        requests the shot block of the next pending time point. the camera
+        thread waits for a free buffer and for the stage before reading out
+        """
+        self.timestep = self.pending.popleft()
+        self.in_flight = self.in_flight+1
+        self.reading_out = True
+        self.point_started.emit(self.sweep_index, self.timestep)
+        time = self.times[self.timestep]
+        if self.target_time != time:
+            self.start_move(time)  # a retake, or the first point of a sweep
+        self.message.emit('Acquiring '+str(self.config['num_shots'])+' shots')
+        self.processing.settings_changed.emit(self.processing_settings(time_point=self.timestep))  # queued up in the processing thread, one for each block
+        self.acquisition.start_acquire.emit()
+        return
+
+    def advance(self):
+        """
+        requests the next pending point as soon as the camera is free, or
+        finishes the sweep once every point of it is back. called when a block
+        is read out and when a point comes back, which arrive in either order
+        """
+        if self.reading_out is True:
+            return
+        if len(self.pending) > 0:
+            self.acquire()
+        elif self.in_flight == 0:
+            self.post_sweep()
+        return
+
+    @pyqtSlot(np.ndarray, np.ndarray, int, int, int)
+    def post_readout(self, probe, reference, first_pixel, num_pixels, buffer_index):
+        """
+        the shots of this point are read out, so the next point is requested
+        straight away: the stage sets off and the camera reads out into the
+        other buffer while this one is processed. a sweep only ends once all
+        of its points are back, in case one has to be retaken, so at the last
+        point the stage only sets off for the start of the next sweep
+        """
+        self.reading_out = False
+        if self.stop_request is True:
+            if self.in_flight == 0:
+                self.finish()
+            return
+        if (len(self.pending) == 0) and (self.sweep_index < self.num_sweeps-1):
+            self.start_move(self.times[0])
+        self.advance()
+        return
+
+    point_done = pyqtSignal(object)
+    @pyqtSlot(object)
+    def post_acquire(self, point):
+        """
+        hands the point on with its place in the run. a rejected point goes
+        back to the front of the queue to be retaken. a point the processing
+        failed on stops the run, it would most likely fail again
+        """
+        self.in_flight = self.in_flight-1
+        point['sweep_index'] = self.sweep_index
+        point['timestep'] = point['time_point']
+        if 'error' in point:
+            self.message.emit(point['error'])
+            self.stop()
+        else:
+            if point['num_dropped_shots'] > 1:
+                self.message.emit('dropped '+str(point['num_dropped_shots'])+' shots')
+            self.point_done.emit(point)
+        if self.stop_request is True:
+            if (self.in_flight == 0) and (self.reading_out is False):
+                self.finish()
+            return
+        if (point['high_std'] is True) or (point['high_dtt'] is True):
+            self.message.emit('retaking point')
+            self.pending.appendleft(point['time_point'])
+        self.advance()
+        return
+
+    def post_sweep(self):
+        if self.config['test_run'] is False:
+            self.message.emit('Saving Sweep '+str(self.sweep_index))
+        self.processing.start_next_sweep.emit(self.config['waves'], self.config['test_run'] is False)
+        return
+
+    @pyqtSlot()
+    def post_save_sweep(self):
+        self.sweep_index = self.sweep_index+1
+        if (self.sweep_index == self.num_sweeps) or (self.stop_request is True):
+            self.finish()
+        else:
+            self.message.emit('Starting Sweep '+str(self.sweep_index))
+            self.start_sweep()
+        return
+
+    write_failed = pyqtSignal(str)
+
+    finished = pyqtSignal(bool)
+    def finish(self):
+        """
+        stops both threads, the processing thread closes the file on its way
+        out. a shared acquisition is only disconnected, for the next run
+        """
+        self.acquisition.data_ready.disconnect(self.processing.process)
+        self.acquisition.data_ready.disconnect(self.post_readout)
+        if self.acquire_thread is not None:
+            self.acquire_thread.quit()
+        self.processing_thread.quit()
+        self.finished.emit(self.stop_request)
+        return
+
+    def stop(self):
+        self.message.emit('Stopped')
+        self.stop_request = True
+        return
+
+    def wait(self):
+        """
+        blocks until both threads have finished and the file is closed,
+        returns straight away if the run never got that far
+        """
+        if self.acquire_thread is not None:
+            self.acquire_thread.wait()
+        if self.processing_thread is not None:
+            self.processing_thread.wait()
+        return
+
+    def start_move(self, new_time):
+        self.message.emit('Moving to: '+str(new_time))
+        self.tau_flip_request = self.delay.start_move(new_time)
+        self.target_time = new_time
+        return
+
+
+def calculate_times_exponential(start_time, end_time, num_points):
+    num_before_zero = 10
+    step = 0.1
+    before_zero = np.linspace(start_time, 0, num_before_zero, endpoint=False)
+    zero_onwards = np.geomspace(step, end_time+step, num_points-num_before_zero)-step
+    times = np.concatenate((before_zero, zero_onwards))
+    return times
+
+
+class JobQueue(QObject):
+    """
+    runs measurement jobs one after another, on one camera and one
+    acquisition thread. a job is a run config as made by complete_config.
+    the background of a job is used again for the next one when nothing it
+    depends on has changed, so a new one is only taken when needed.
+    set_beams(blocked) is called before and after each new background, while
+    nothing is acquiring, and may block, e.g. on a prompt to the operator.
+    the status of every job is written to status_filepath as it changes
+    """
+
+    def __init__(self, camera, jobs, connect_delay, set_beams=None, status_filepath=None):
+        super(QObject, self).__init__()
+        self.camera = camera
+        self.jobs = jobs
+        self.connect_delay = connect_delay  # callable (config) -> initialised delay
+        self.set_beams = set_beams
+        self.status_filepath = status_filepath
+        self.delays = {}
+        self.status = ['queued' for job in jobs]
+        self.points_done = [0 for job in jobs]
+        self.job_index = 0
+        self.engine = None
+        self.bgd = None
+        self.bgd_key = None
+        self.bgd_job = None
+        self.stop_request = False
+        self.acquire_thread = QtCore.QThread()
+        self.acquire_thread.start()
+
+        self.acquisition = Acquisition(self.camera)
+
+        self.acquisition.moveToThread(self.acquire_thread)
+        self.acquisition.start_acquire.connect(self.acquisition.acquire)
+        self.progress_changed.connect(self.save_progress)
+
+    @staticmethod
+    def background_key(config):
+        """
+        everything the background of a job depends on
+        """
+        processing = config['processing']
+        return (tuple(processing['threshold']), processing['linear_corr'] is None, np.dtype(processing['dtype']).name)
+
+    def num_points(self, index):
+        return self.jobs[index]['num_sweeps']*self.jobs[index]['times'].size
+
+    def progress(self):
+        """
+        one line per job: name, status and points measured out of the total
+        """
+        lines = []
+        for index, job in enumerate(self.jobs):
+            lines.append('{0:>3}. {1:<30} {2:<10} {3}/{4} points'.format(index+1, job['name'], self.status[index], self.points_done[index], self.num_points(index)))
+        return lines
+
+    def save_progress(self):
+        if self.status_filepath is not None:
+            with open(self.status_filepath, 'w') as status_file:
+                status_file.write('\n'.join(self.progress())+'\n')
+        return
+
+    message = pyqtSignal(str)
+    background_started = pyqtSignal()
+    background_taken = pyqtSignal()
+    progress_changed = pyqtSignal()
+    job_started = pyqtSignal(object)
+    def start(self):
+        self.start_job(0)
+        return
+
+    def start_job(self, index):
+        self.job_index = index
+        if (index == len(self.jobs)) or (self.stop_request is True):
+            self.finish()
+            return
+        config = self.jobs[index]
+        delay_key = (config['delay'], config['t0'])
+        if delay_key not in self.delays:
+            self.delays[delay_key] = self.connect_delay(config)
+        delay = self.delays[delay_key]
+        if delay.check_times(config['times']) is False:
+            self.status[index] = 'failed'
+            self.message.emit('Skipping '+config['name']+', one or more time point exceeds the limits of the delay')
+            self.progress_changed.emit()
+            self.start_job(index+1)
+            return
+        bgd = None
+        if (config['reuse_background'] is True) and (self.bgd_key == self.background_key(config)):
+            bgd = self.bgd
+            config['metadata']['background'] = 'reused from '+self.bgd_job
+        self.status[index] = 'running'
+        self.progress_changed.emit()
+        self.engine = MeasurementEngine(self.camera, delay, config, acquisition=self.acquisition)
+        self.engine.message.connect(self.message)
+        self.engine.background_started.connect(self.background_started)
+        self.engine.background_taken.connect(self.background_taken)
+        self.engine.point_done.connect(self.post_point)
+        self.engine.write_failed.connect(self.message)
+        self.engine.finished.connect(self.post_job)
+        self.job_started.emit(self.engine)
+        if (self.set_beams is not None) and (bgd is None) and (config['test_run'] is False):
+            self.set_beams(True)
+            self.engine.hold_after_background = True
+            self.engine.background_taken.connect(lambda: QtCore.QTimer.singleShot(0, self.post_background))
+        self.engine.start(bgd=bgd)
+        return
+
+    def post_background(self):
+        """
+        unblocks the beams once the background is in and nothing is
+        acquiring, then starts the sweeps
+        """
+        self.set_beams(False)
+        self.engine.run()
+        return
+
+    @pyqtSlot(object)
+    def post_point(self, point):
+        if (point['high_std'] is False) and (point['high_dtt'] is False):
+            self.points_done[self.job_index] += 1
+            self.save_progress()
+        return
+
+    @pyqtSlot(bool)
+    def post_job(self, stopped):
+        """
+        waits for the file of the job to be closed, then starts the next one
+        """
+        self.engine.wait()
+        config = self.jobs[self.job_index]
+        self.status[self.job_index] = 'stopped' if stopped else 'done'
+        if (config['test_run'] is False) and (self.engine.bgd is not None):
+            if self.engine.bgd is not self.bgd:
+                self.bgd_job = config['name']
+            self.bgd, self.bgd_key = self.engine.bgd, self.background_key(config)
+        self.progress_changed.emit()
+        QtCore.QTimer.singleShot(0, lambda: self.start_job(self.job_index+1))  # out of the finished handler of the engine
+        return
+
+    finished = pyqtSignal()
+    def finish(self):
+        for index in range(self.job_index, len(self.jobs)):
+            if self.status[index] == 'queued':
+                self.status[index] = 'skipped'
+        self.acquire_thread.quit()
+        self.progress_changed.emit()
+        self.finished.emit()
+        return
+
+    def stop(self):
+        """
+        stops the running job, the rest of the queue is skipped
+        """
+        self.stop_request = True
+        if self.engine is not None:
+            self.engine.stop()
+        return
+
+    def close(self):
+        self.acquire_thread.wait()
+        for delay in self.delays.values():
+            delay.close()
+        return
+
+
+def complete_config(config, defaults=None):
+    """
+    a run config from the keys of a job on top of the defaults of the file,
+    see the module docstring
+    """
+    config = dict(defaults or {}, **config)
+    if isinstance(config['times'], str):
+        config['times'] = np.genfromtxt(config['times'], dtype=float)
+    config['times'] = np.asarray(config['times'], dtype=float)
+    config.setdefault('name', os.path.basename(config['filepath']))
+    config.setdefault('num_sweeps', 1)
+    config.setdefault('num_shots', 1000)
+    config.setdefault('dcshotfactor', 1)
+    config.setdefault('test_run', False)
+    config.setdefault('camera', 'VIS')
+    config.setdefault('delay', 'Long Stage')
+    config.setdefault('t0', 0)
+    config.setdefault('simulate', False)
+    config.setdefault('reuse_background', True)
+    config['metadata'] = dict(config.get('metadata', {}))
+    config['processing'] = {'threshold': config.get('threshold', [0, 15000]),
+                            'linear_corr': None,
+                            'refman': None,
+                            'use_reference': config.get('use_reference', True),
+                            'use_avg_off_shots': config.get('use_avg_off_shots', True),
+                            'cutoff': config.get('cutoff', None),
+                            'max_dtt': config.get('max_dtt', 1),
+                            'dtype': processing_dtype(np.dtype(config.get('precision', 'float64')).type)}
+    return config
+
+
+def load_jobs(filepath):
+    """
+    the run configs in a config file, one for a single run
+    """
+    with open(filepath) as file:
+        contents = json.load(file)
+    if 'jobs' in contents:
+        return [complete_config(job, contents.get('defaults', {})) for job in contents['jobs']]
+    return [complete_config(contents)]
+
+
+def connect_camera(config):
+    """
+    camera named in the config, initialised. the hardware modules are only
+    imported when they are needed, so simulated runs work anywhere
+    """
+    if config['simulate'] is True:
+        from simulation import SimulatedStresingCameras
+        camera = SimulatedStresingCameras(config['camera'])
+    else:
+        from cameras import StresingCameras
+        camera = StresingCameras(config['camera'])
+    camera.initialise()
+    return camera
+
+
+def connect_delay(config):
+    if config['simulate'] is True:
+        from simulation import SimulatedPILongStageDelay, SimulatedPIShortStageDelay, SimulatedInnolasPinkLaserDelay
+        delays = {'Long Stage': SimulatedPILongStageDelay,
+                  'Short Stage': SimulatedPIShortStageDelay,
+                  'Pink Laser': SimulatedInnolasPinkLaserDelay}
+    else:
+        from delays import PILongStageDelay, PIShortStageDelay, InnolasPinkLaserDelay
+        delays = {'Long Stage': PILongStageDelay,
+                  'Short Stage': PIShortStageDelay,
+                  'Pink Laser': InnolasPinkLaserDelay}
+    delay = delays[config['delay']](config['t0'])
+    delay.initialise()
+    return delay
+
+
+def prepare_job(config, camera):
+    """
+    fills in what depends on the camera: wavelengths, cutoff and metadata
+    """
+    if 'calib' in config:
+        pixel_low, pixel_high, wavelength_low, wavelength_high = config['calib']
+        slope = (wavelength_high-wavelength_low)/(pixel_high-pixel_low)
+        config['waves'] = np.arange(camera.num_pixels)*slope+wavelength_low-slope*pixel_low
+    else:
+        config['waves'] = np.arange(camera.num_pixels, dtype=float)
+    if config['processing']['cutoff'] is None:
+        config['processing']['cutoff'] = [0, camera.num_pixels]
+    config['metadata'].update({'date (yyyy-mm-dd)': str(datetime.date.today()),
+                               'camera type': config['camera'],
+                               'delay type': config['delay'],
+                               'time zero': config['t0'],
+                               'num shots': config['num_shots'],
+                               'dark correction shot factor': config['dcshotfactor'],
+                               'use reference': config['processing']['use_reference'],
+                               'avg off shots': config['processing']['use_avg_off_shots'],
+                               'precision': np.dtype(config['processing']['dtype']).name,
+                               'simulated': config['simulate']})
+    return config
+
+
+def main(config_filepath):
+    app = QtCore.QCoreApplication(sys.argv)
+    jobs = load_jobs(config_filepath)
+    for config in jobs:
+        if (config['camera'] != jobs[0]['camera']) or (config['simulate'] != jobs[0]['simulate']):
+            print('camera and simulate must be the same for every job')
+            return 1
+    camera = connect_camera(jobs[0])
+    for config in jobs:
+        prepare_job(config, camera)
+
+    if jobs[0]['simulate'] is True:
+        set_beams = lambda blocked: setattr(camera, 'blocked', blocked)
+    else:
+        set_beams = lambda blocked: input(('block' if blocked else 'unblock')+' probe and reference, then press enter')
+    status_filepath = os.path.join(os.path.dirname(os.path.abspath(jobs[0]['filepath'])), os.path.splitext(os.path.basename(config_filepath))[0]+'_status.txt')
+    queue = JobQueue(camera, jobs, connect_delay, set_beams=set_beams, status_filepath=status_filepath)
+    queue.message.connect(print)
+    if jobs[0]['simulate'] is True:
+        queue.job_started.connect(lambda engine: setattr(camera, 'delay', engine.delay))
+    queue.progress_changed.connect(lambda: print('\n'.join(queue.progress())))
+    queue.finished.connect(app.quit)
+    QtCore.QTimer.singleShot(0, queue.start)
+    app.exec_()
+    queue.close()
+    camera.close()
+    return 0 if all(status == 'done' for status in queue.status) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
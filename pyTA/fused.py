@@ -0,0 +1,238 @@
+import os
+import importlib
+import numpy as np
+from dtt import DataProcessing, Workspace
+
+try:
+    import numba
+except ImportError:
+    numba = None  # optional, FusedProcessing then falls back to the numpy stages in DataProcessing
+
+
+def threading_layer():
+    """
+    the kernel is called from the processing QThread, which numba did not
+    start. with tbb the interpreter then never exits, omp and workqueue are
+    fine. omp also copes with calls from more than one thread, so it is
+    preferred when numba was built with it
+    """
+    for module in ('numba.np.ufunc.omppool', 'numba.npyufunc.omppool'):
+        try:
+            importlib.import_module(module)
+            return 'omp'
+        except (ImportError, OSError):
+            pass
+    return 'workqueue'
+
+
+if (numba is not None) and ('NUMBA_THREADING_LAYER' not in os.environ):
+    numba.config.THREADING_LAYER = threading_layer()  # before the first parallel kernel is compiled
+
+
+def jit(parallel=False):
+    """
+    compiles with numba if it is installed, otherwise leaves the function as plain python
+    """
+    def decorator(function):
+        if numba is None:
+            return function
+        return numba.njit(cache=True, parallel=parallel)(function)
+    return decorator
+
+
+prange = range if numba is None else numba.prange
+
+
+def processing_dtype(dtype):
+    """
+    the precision FusedProcessing actually works in when asked for dtype:
+    always float64 with numba, dtype on the numpy fallback
+    """
+    return dtype if numba is None else np.float64
+
+# rows of the statistics arrays returned by _fused_kernel
+PROBE_ON, PROBE_OFF, REF_ON, REF_OFF, REFD_ON, REFD_OFF, DTT, PROBE_ERROR, REF_ERROR, PROBE_DIFF = range(10)
+PIXEL_BLOCK = 64  # pixels per parallel task, keeps each thread reading along the rows of the shot block
+
+
+@jit()
+def _corrected_row(raw, shot, first_pixel, first, last, scale, bgd, out):
+    for j in range(first, last):
+        out[j-first] = raw[shot, first_pixel+j]*scale[j]-bgd[j]
+
+
+@jit()
+def _reference_row(raw, shot, first_pixel, first, last, scale, bgd, use_refman, refman_index, refman_weight, vs, vo, out):
+    if not use_refman:
+        _corrected_row(raw, shot, first_pixel, first, last, scale, bgd, out)
+        return
+    for j in range(first, last):
+        i = refman_index[j]
+        left = raw[shot, first_pixel+i]*scale[i]-bgd[i]
+        right = raw[shot, first_pixel+i+1]*scale[i+1]-bgd[i+1]
+        out[j-first] = (left+(right-left)*refman_weight[j])*vs+vo
+
+
+@jit()
+def _accumulate(shift, total, squares, row, first, values):
+    """
+    running sums shifted by the first pair's value, which keeps the variance
+    stable without the per-value division of Welford's update
+    """
+    for j in range(values.size):
+        delta = values[j]-shift[row, first+j]
+        total[row, first+j] += delta
+        squares[row, first+j] += delta*delta
+
+
+@jit(parallel=True)
+def _fused_kernel(probe, reference, first_pixel, num_pixels, on_index, off_index, probe_scale, ref_scale, bgd,
+                  use_refman, refman_index, refman_weight, vs, vo, use_reference, use_avg_off_shots):
+    """
+    linear correction, background subtraction, reference manipulation and the
+    dtt statistics for every shot pair, straight from the raw uint16 block.
+    one pass, plus a second over the reference only when the reference error
+    is taken against the average off shot. blocks of pixels run in parallel.
+    returns the shift, sum and sum of squares of every statistic row
+    """
+    num_pairs = on_index.size
+    shift = np.zeros((10, num_pixels))
+    total = np.zeros((10, num_pixels))
+    squares = np.zeros((10, num_pixels))
+    num_blocks = (num_pixels+PIXEL_BLOCK-1)//PIXEL_BLOCK
+    bgd_probe_on, bgd_probe_off, bgd_reference_on, bgd_reference_off = bgd[0], bgd[1], bgd[2], bgd[3]
+    for b in prange(num_blocks):
+        first = b*PIXEL_BLOCK
+        last = min(first+PIXEL_BLOCK, num_pixels)
+        rows = np.empty((10, last-first))
+        for k in range(num_pairs):
+            _corrected_row(probe, on_index[k], first_pixel, first, last, probe_scale, bgd_probe_on, rows[PROBE_ON])
+            _corrected_row(probe, off_index[k], first_pixel, first, last, probe_scale, bgd_probe_off, rows[PROBE_OFF])
+            _reference_row(reference, on_index[k], first_pixel, first, last, ref_scale, bgd_reference_on, use_refman, refman_index, refman_weight, vs, vo, rows[REF_ON])
+            _reference_row(reference, off_index[k], first_pixel, first, last, ref_scale, bgd_reference_off, use_refman, refman_index, refman_weight, vs, vo, rows[REF_OFF])
+            for j in range(last-first):
+                probe_on, probe_off = rows[PROBE_ON, j], rows[PROBE_OFF, j]
+                reference_on, reference_off = rows[REF_ON, j], rows[REF_OFF, j]
+                refd_on = probe_on/reference_on
+                refd_off = probe_off/reference_off
+                rows[REFD_ON, j] = refd_on
+                rows[REFD_OFF, j] = refd_off
+                rows[PROBE_DIFF, j] = probe_on-probe_off
+                rows[PROBE_ERROR, j] = 2*(probe_on-probe_off)/(probe_on+probe_off)
+                rows[REF_ERROR, j] = 2*(reference_on-reference_off)/(reference_on+reference_off)
+                if use_reference:
+                    rows[DTT, j] = (refd_on-refd_off)/refd_off
+                else:
+                    rows[DTT, j] = (probe_on-probe_off)/probe_off
+            if k == 0:
+                shift[:, first:last] = rows
+            for row in range(10):
+                _accumulate(shift, total, squares, row, first, rows[row])
+        if use_reference and use_avg_off_shots and num_pairs > 0:
+            average_off = shift[REF_OFF, first:last]+total[REF_OFF, first:last]/num_pairs
+            shift[REF_ERROR, first:last] = 0
+            total[REF_ERROR, first:last] = 0
+            squares[REF_ERROR, first:last] = 0
+            for k in range(num_pairs):
+                _reference_row(reference, on_index[k], first_pixel, first, last, ref_scale, bgd_reference_on, use_refman, refman_index, refman_weight, vs, vo, rows[REF_ON])
+                for j in range(last-first):
+                    rows[REF_ERROR, j] = 2*(rows[REF_ON, j]-average_off[j])/(rows[REF_ON, j]+average_off[j])
+                if k == 0:
+                    shift[REF_ERROR, first:last] = rows[REF_ERROR]
+                _accumulate(shift, total, squares, REF_ERROR, first, rows[REF_ERROR])
+    return shift, total, squares
+
+
+class FusedProcessing(DataProcessing):
+    """
+    DataProcessing with the whole per-point pipeline of process() fused into
+    one or two passes over the raw uint16 shot block, compiled with numba.
+    the pump on/off shot matrices are never built, only their statistics.
+    without numba everything falls back to the numpy stages in DataProcessing.
+    the numba path always accumulates in float64, the precision setting only
+    applies to the fallback. pass dtype through processing_dtype first so the
+    precision saved with a run is the one used. the numba path keeps no float
+    copies of the shot block, make_workspace only gives the fallback one
+    """
+
+    def __init__(self, probe_array, reference_array, first_pixel, num_pixels, workspace=None, dtype=np.float64):
+        if numba is None:
+            super(FusedProcessing, self).__init__(probe_array, reference_array, first_pixel, num_pixels, workspace=workspace, dtype=dtype)
+            self.untrimmed_reference_array = reference_array
+            return
+        self.dtype = np.float64  # see processing_dtype
+        self.workspace = None  # the kernel reads the raw block, no float copies of it are made
+        self.refman_key = None
+        self.update(probe_array, reference_array, first_pixel, num_pixels)
+
+    @staticmethod
+    def make_workspace(num_shots, num_pixels, dtype=np.float64):
+        """
+        workspace for the numpy fallback, None with numba, which has no use for one
+        """
+        if numba is not None:
+            return None
+        return Workspace(num_shots, num_pixels, dtype=dtype)
+
+    def update(self, probe_array, reference_array, first_pixel, num_pixels):
+        if numba is None:
+            return super(FusedProcessing, self).update(probe_array, reference_array, first_pixel, num_pixels)
+        self.untrimmed_probe_array = probe_array
+        self.untrimmed_reference_array = reference_array
+        self.first_pixel = first_pixel
+        self.num_pixels = num_pixels
+
+    def process(self, threshold, tau_flip_request=False, linear_corr=None, bgd=None, refman=None, use_reference=True, use_avg_off_shots=True, cutoff=[0, 100], max_dtt=1):
+        if numba is None:
+            return super(FusedProcessing, self).process(threshold, tau_flip_request, linear_corr, bgd, refman, use_reference, use_avg_off_shots, cutoff, max_dtt)
+        high_std, on_index, off_index = self.find_pairs(threshold, tau_flip_request)
+        if linear_corr is None:
+            linear_corr = (np.ones(self.num_pixels), np.ones(self.num_pixels))
+        if bgd is None:
+            bgd_spectra = np.zeros((4, self.num_pixels))
+        else:
+            bgd_spectra = np.vstack((bgd.probe_on, bgd.probe_off, bgd.reference_on, bgd.reference_off)).astype(float)
+        if refman is None:
+            use_refman, vs, vo = False, 1.0, 0.0
+            refman_index, refman_weight = np.zeros(self.num_pixels, dtype=int), np.zeros(self.num_pixels)
+        else:
+            vs, vo, ho, sc, sf = refman
+            if vs <= 0:
+                vs = 1
+            self.set_refman_interp(ho, sc, sf)
+            use_refman, refman_index, refman_weight = True, self.refman_index, self.refman_weight.astype(float)
+        shift, total, squares = _fused_kernel(self.untrimmed_probe_array, self.untrimmed_reference_array, self.first_pixel, self.num_pixels,
+                              on_index, off_index, 1/np.asarray(linear_corr[0], dtype=float), 1/np.asarray(linear_corr[1], dtype=float), bgd_spectra,
+                              use_refman, refman_index, refman_weight, float(vs), float(vo), use_reference, use_avg_off_shots)
+        num_pairs = on_index.size
+        if num_pairs == 0:
+            mean = std = np.full((10, self.num_pixels), np.nan)  # nothing to average, check_dtt rejects the point like the numpy path
+        else:
+            mean = shift+total/num_pairs
+            std = np.sqrt(np.maximum(squares/num_pairs-(total/num_pairs)**2, 0))
+        self.probe_on, self.probe_off = mean[PROBE_ON], mean[PROBE_OFF]
+        self.reference_on, self.reference_off = mean[REF_ON], mean[REF_OFF]
+        self.probe_on_std, self.reference_on_std = std[PROBE_ON], std[REF_ON]
+        if use_reference is True:
+            self.refd_probe_on, self.refd_probe_off = mean[REFD_ON], mean[REFD_OFF]
+            self.dtt_error = std[REFD_OFF]
+            self.ref_shot_error = std[REF_ERROR]
+            if use_avg_off_shots is True:
+                self.dtt = (self.refd_probe_on-self.refd_probe_off)/self.refd_probe_off  # mean of (on-off)/avg_off, which is linear in the shots
+                self.probe_shot_error = np.abs(2*std[PROBE_DIFF]/(self.probe_on+self.probe_off))
+            else:
+                self.dtt = mean[DTT]
+                self.probe_shot_error = std[PROBE_ERROR]
+        else:
+            if use_avg_off_shots is True:
+                self.dtt = (self.probe_on-self.probe_off)/self.probe_off
+            else:
+                self.dtt = mean[DTT]
+            self.probe_shot_error = std[PROBE_ERROR]
+        high_dtt = self.check_dtt(cutoff, max_dtt)
+        return high_std, high_dtt
+
+    def on_shot_std(self):
+        if numba is None:
+            return super(FusedProcessing, self).on_shot_std()
+        return self.probe_on_std, self.reference_on_std
@@ -314,6 +314,9 @@ class Ui_pyTAgui(object):
         self.a_stop_btn.setGeometry(QtCore.QRect(170, 30, 71, 31))
         self.a_stop_btn.setStyleSheet("background-color: rgb(255, 0, 0);")
         self.a_stop_btn.setObjectName("a_stop_btn")
+        self.a_resume_btn = QtWidgets.QPushButton(self.a_launch_box)
+        self.a_resume_btn.setGeometry(QtCore.QRect(250, 30, 81, 31))
+        self.a_resume_btn.setObjectName("a_resume_btn")
         self.groupBox_6 = QtWidgets.QGroupBox(self.acquisition_tab)
         self.groupBox_6.setGeometry(QtCore.QRect(1580, 9, 191, 51))
         self.groupBox_6.setObjectName("groupBox_6")
@@ -321,6 +324,11 @@ class Ui_pyTAgui(object):
         self.a_plot_log_t_cb.setGeometry(QtCore.QRect(20, 20, 82, 17))
         self.a_plot_log_t_cb.setAutoExclusive(False)
         self.a_plot_log_t_cb.setObjectName("a_plot_log_t_cb")
+        self.a_max_plot_rate = QtWidgets.QSpinBox(self.groupBox_6)
+        self.a_max_plot_rate.setGeometry(QtCore.QRect(100, 17, 81, 22))
+        self.a_max_plot_rate.setMinimum(1)
+        self.a_max_plot_rate.setMaximum(60)
+        self.a_max_plot_rate.setObjectName("a_max_plot_rate")
         self.groupBox_7 = QtWidgets.QGroupBox(self.acquisition_tab)
         self.groupBox_7.setGeometry(QtCore.QRect(1580, 70, 191, 541))
         self.groupBox_7.setObjectName("groupBox_7")
@@ -336,7 +344,7 @@ class Ui_pyTAgui(object):
         self.a_kinetic_graph = PlotWidget(self.acquisition_tab)
         self.a_kinetic_graph.setGeometry(QtCore.QRect(360, 410, 601, 391))
         self.a_kinetic_graph.setObjectName("a_kinetic_graph")
-        self.a_colourmap = ImageView(self.acquisition_tab)
+        self.a_colourmap = ColourMapView(self.acquisition_tab)
         self.a_colourmap.setGeometry(QtCore.QRect(360, 21, 601, 391))
         self.a_colourmap.setObjectName("a_colourmap")
         self.a_measurement_progress_bar = QtWidgets.QProgressBar(self.acquisition_tab)
@@ -590,6 +598,9 @@ class Ui_pyTAgui(object):
         self.label_53 = QtWidgets.QLabel(self.d_other_box)
         self.label_53.setGeometry(QtCore.QRect(210, 30, 51, 21))
         self.label_53.setObjectName("label_53")
+        self.d_use_float32 = QtWidgets.QCheckBox(self.d_other_box)
+        self.d_use_float32.setGeometry(QtCore.QRect(10, 90, 151, 17))
+        self.d_use_float32.setObjectName("d_use_float32")
         self.d_error_graph = PlotWidget(self.diagnostics_tab)
         self.d_error_graph.setGeometry(QtCore.QRect(360, 20, 701, 391))
         self.d_error_graph.setObjectName("d_error_graph")
@@ -918,8 +929,11 @@ class Ui_pyTAgui(object):
         self.a_run_btn.setText(_translate("pyTAgui", "Run"))
         self.a_test_run_btn.setText(_translate("pyTAgui", "Test"))
         self.a_stop_btn.setText(_translate("pyTAgui", "Stop"))
+        self.a_resume_btn.setText(_translate("pyTAgui", "Resume..."))
         self.groupBox_6.setTitle(_translate("pyTAgui", "Plotting Options"))
         self.a_plot_log_t_cb.setText(_translate("pyTAgui", "log time"))
+        self.a_max_plot_rate.setSuffix(_translate("pyTAgui", " fps"))
+        self.a_max_plot_rate.setPrefix(_translate("pyTAgui", "max "))
         self.groupBox_7.setTitle(_translate("pyTAgui", "Log"))
         self.a_cutoff_box.setTitle(_translate("pyTAgui", "Cutoff"))
         self.a_use_cutoff.setText(_translate("pyTAgui", "Use Cutoff"))
@@ -963,6 +977,7 @@ class Ui_pyTAgui(object):
         self.d_set_linear_corr_btn.setText(_translate("pyTAgui", "Set"))
         self.d_use_avg_off_shots.setText(_translate("pyTAgui", "Use Avg Off Shots"))
         self.label_53.setText(_translate("pyTAgui", "Max dtt"))
+        self.d_use_float32.setText(_translate("pyTAgui", "Use Float32"))
         self.groupBox_17.setTitle(_translate("pyTAgui", "Log"))
         self.d_cutoff_box.setTitle(_translate("pyTAgui", "Cutoff"))
         self.d_use_cutoff.setText(_translate("pyTAgui", "Use Cutoff"))
@@ -1012,4 +1027,5 @@ class Ui_pyTAgui(object):
         self.tabs.setTabText(self.tabs.indexOf(self.motor_tab), _translate("pyTAgui", "Crystal Stage Motors"))
         self.tabs.setTabText(self.tabs.indexOf(self.log_tab), _translate("pyTAgui", "Log"))
 
-from pyqtgraph import ImageView, PlotWidget
+from colourmap import ColourMapView
+from pyqtgraph import PlotWidget
@@ -0,0 +1,77 @@
+import os
+import logging
+import logging.handlers
+from collections import deque
+
+
+class HistoryLog:
+    """
+    the history shown in the a_history and d_history boxes. messages wait in
+    a ring buffer until flush writes them to the boxes in one go, which the
+    gui does from a timer, and the boxes only keep the last max_lines, so a
+    message costs the same at the end of a long run as at the start. during
+    a run every message is also written to a rotating log file next to the
+    hdf5 file. the messages of the run from before the file is opened, e.g.
+    of the background, are kept and written to it first, with their own times
+    """
+
+    def __init__(self, widgets, max_lines=5000, max_bytes=10*1024*1024, backup_count=5):
+        self.widgets = widgets
+        for widget in self.widgets:
+            widget.setMaximumBlockCount(max_lines)
+        self.pending = deque(maxlen=max_lines)  # older ones would be dropped by the boxes anyway
+        self.unlogged = deque(maxlen=max_lines)  # log records of the run from before its file is open
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.logger = logging.getLogger('pyTA.history')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.handler = None
+
+    def append(self, message):
+        self.pending.append(message)
+        record = self.logger.makeRecord(self.logger.name, logging.INFO, __file__, 0, message, None, None)
+        if self.handler is None:
+            self.unlogged.append(record)
+        else:
+            self.logger.handle(record)
+        return
+
+    def start_run(self):
+        """
+        called when a run is launched, so its log does not start with the
+        messages from between runs, e.g. diagnostics or the end of the last one
+        """
+        self.unlogged.clear()
+        return
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        text = '\n'.join(self.pending)
+        self.pending.clear()
+        for widget in self.widgets:
+            widget.appendPlainText(text)
+        return
+
+    def open_file(self, hdf5_filepath):
+        """
+        streams the messages to <run>.log next to the hdf5 file of the run,
+        rotated every max_bytes, starting with the ones from since the run
+        was started
+        """
+        self.close_file()
+        self.filepath = os.path.splitext(hdf5_filepath)[0]+'.log'
+        self.handler = logging.handlers.RotatingFileHandler(self.filepath, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        self.handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        self.logger.addHandler(self.handler)
+        while len(self.unlogged) > 0:
+            self.handler.handle(self.unlogged.popleft())
+        return
+
+    def close_file(self):
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+            self.handler.close()
+            self.handler = None
+        return
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class NearestIndex:
+    """
+    finds the point of an axis nearest to a value, e.g. under a plot marker.
+    the axis is sorted once, so every lookup is a binary search. it need not
+    be in order and nan entries are never returned
+    """
+
+    def __init__(self, axis):
+        axis = np.asarray(axis, dtype=float)
+        finite = np.flatnonzero(np.isfinite(axis))
+        self.order = finite[np.argsort(axis[finite], kind='mergesort')]
+        self.sorted_axis = axis[self.order]
+
+    def __call__(self, value):
+        """
+        index of the nearest point, the first in the axis of equally near ones
+        """
+        above = int(np.searchsorted(self.sorted_axis, value))
+        candidates = []
+        if above < self.sorted_axis.size:
+            candidates.append(above)
+        if above > 0:
+            candidates.append(int(np.searchsorted(self.sorted_axis, self.sorted_axis[above-1])))  # first of the equal points below
+        distance = min((self.sorted_axis[i]-value)**2 for i in candidates)
+        return min(int(self.order[i]) for i in candidates if (self.sorted_axis[i]-value)**2 == distance)
+
+
+class PlotModel:
+    """
+    what the plots of a run need that is fixed when it starts: the axes, the
+    cutoff and views into the data the gui keeps for the run. the gui writes
+    each point into that data in place, so a refresh only reads the views.
+    the spectra of each point are cut with the same slice
+    """
+
+    def __init__(self, waves, times, use_calib=True, cutoff=None):
+        self.waves = np.asarray(waves)  # calibrated, every pixel
+        if use_calib is True:
+            self.axis = self.waves
+        else:
+            self.axis = np.arange(self.waves.size, dtype=float)
+        self.cut = slice(None) if cutoff is None else slice(cutoff[0], cutoff[1])
+        self.plot_waves = self.axis[self.cut]
+        self.plot_times = np.asarray(times)
+        self.time_index = NearestIndex(self.plot_times)
+        self.wavelength_index = NearestIndex(self.axis)  # before the cutoff, so it gives the pixel of the full spectrum
+        self.kinetics_pixel = 0
+        self.avg_data = None
+        self.avg_error_data = None
+        self.sweep_data = None
+
+    def set_data(self, avg_data=None, avg_error_data=None, sweep_data=None):
+        """
+        points the views at new arrays of the run, None keeps the current one
+        """
+        if avg_data is not None:
+            self.avg_data = avg_data
+            self.dtt = avg_data[:, self.cut]
+        if avg_error_data is not None:
+            self.avg_error_data = avg_error_data
+        if sweep_data is not None:
+            self.sweep_data = sweep_data
+        self.set_kinetics_pixel(self.kinetics_pixel)
+        return
+
+    def set_kinetics_pixel(self, pixel):
+        self.kinetics_pixel = pixel
+        if self.avg_data is not None:
+            self.kinetic_avg = self.avg_data[:, pixel]
+        if self.avg_error_data is not None:
+            self.kinetic_avg_error = self.avg_error_data[:, pixel]
+        if self.sweep_data is not None:
+            self.kinetic_current = self.sweep_data[:, pixel]
+        return
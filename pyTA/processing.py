@@ -0,0 +1,175 @@
+from collections import deque
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from dtt import check_precision
+from fused import FusedProcessing
+
+
+class Processing(QObject):
+    """
+    lives in its own thread between the camera thread and the gui. owns the
+    DataProcessing of the current point and the SweepProcessing of the run,
+    and only hands plot-ready summaries of each point to the gui, so a slow
+    repaint never holds up the next shot block. the gui must not read the
+    widgets from here, it sends a snapshot of the options before each block.
+    the snapshots queue up in order, as the next block can be requested
+    before this one is processed
+    """
+
+    def __init__(self, acquisition):
+        super(QObject, self).__init__()
+        self.acquisition = acquisition
+        self.settings = deque()
+        self.current_data = None
+        self.current_sweep = None
+        self.precision_checked = False
+
+    settings_changed = pyqtSignal(object)
+    @pyqtSlot(object)
+    def update_settings(self, settings):
+        self.settings.append(settings)
+        return
+
+    start_run = pyqtSignal(object)
+    write_failed = pyqtSignal(str)
+    message = pyqtSignal(str)
+    @pyqtSlot(object)
+    def new_run(self, current_sweep):
+        """
+        takes over the SweepProcessing of a new or resumed run, the gui must not touch it afterwards
+        """
+        self.current_sweep = current_sweep
+        self.precision_checked = False
+        self.current_sweep.start_writer(on_write_error=self.write_failed.emit)
+        return
+
+    point_ready = pyqtSignal(object)
+    @pyqtSlot(np.ndarray, np.ndarray, int, int, int)
+    def process(self, probe, reference, first_pixel, num_pixels, buffer_index):
+        """
+        1. dtt of the shot block, the buffer goes back to the camera as soon as it is processed
+        2. adds accepted points to the sweep when the settings name a time point, and saves them
+        3. emits copies of everything the plots need
+        the first point of a float32 run is also put through check_precision.
+        the buffer goes back whatever happens, a point that fails is emitted
+        with only its time point and the error, for the engine to stop the run
+        """
+        settings = self.settings.popleft()
+        try:
+            try:
+                high_std, high_dtt = self.process_block(probe, reference, first_pixel, num_pixels, settings)
+            finally:
+                self.acquisition.release_buffer(buffer_index)
+            point = self.add_point(settings, high_std, high_dtt)
+        except Exception as exception:
+            point = {'high_std': False,
+                     'high_dtt': True,
+                     'time_point': settings['time_point'],
+                     'num_pairs': 0,
+                     'num_dropped_shots': 0,
+                     'error': 'Error processing point: '+repr(exception)}
+        self.point_ready.emit(point)
+        return
+
+    def process_block(self, probe, reference, first_pixel, num_pixels, settings):
+        try:
+            self.current_data.update(probe,
+                                     reference,
+                                     first_pixel,
+                                     num_pixels)
+        except:
+            self.current_data = FusedProcessing(probe,
+                                                reference,
+                                                first_pixel,
+                                                num_pixels,
+                                                workspace=FusedProcessing.make_workspace(probe.shape[0], num_pixels, dtype=settings['dtype']))
+        high_std, high_dtt = self.current_data.process(settings['threshold'],
+                                                       tau_flip_request=settings['tau_flip_request'],
+                                                       linear_corr=settings['linear_corr'],
+                                                       bgd=settings['bgd'],
+                                                       refman=settings['refman'],
+                                                       use_reference=settings['use_reference'],
+                                                       use_avg_off_shots=settings['use_avg_off_shots'],
+                                                       cutoff=settings['cutoff'],
+                                                       max_dtt=settings['max_dtt'])
+        if (settings['time_point'] is not None) and (self.precision_checked is False) and (settings['dtype'] == np.float32):
+            self.check_precision(probe, reference, first_pixel, num_pixels, settings)
+        return high_std, high_dtt
+
+    def add_point(self, settings, high_std, high_dtt):
+        probe_std, reference_std = self.current_data.on_shot_std()
+        point = {'high_std': high_std,
+                 'high_dtt': high_dtt,
+                 'time_point': settings['time_point'],
+                 'dtt': np.array(self.current_data.dtt),
+                 'probe_shot_error': np.array(self.current_data.probe_shot_error),
+                 'probe_on': np.array(self.current_data.probe_on),
+                 'reference_on': np.array(self.current_data.reference_on),
+                 'probe_std': np.array(probe_std),
+                 'reference_std': np.array(reference_std),
+                 'trigger': np.array(self.current_data.trigger),
+                 'num_pairs': self.current_data.num_pairs,
+                 'num_dropped_shots': self.current_data.num_dropped_shots}
+        if settings['use_reference'] is True:
+            point['ref_shot_error'] = np.array(self.current_data.ref_shot_error)
+            point['dtt_error'] = np.array(self.current_data.dtt_error)
+        if (settings['time_point'] is not None) and (high_std is False) and (high_dtt is False):
+            self.current_sweep.add_current_data(self.current_data.dtt, time_point=settings['time_point'])
+            if settings['save'] is True:
+                self.current_sweep.save_point(settings['time_point'])
+            point['sweep_dtt'] = np.array(self.current_sweep.current_data[settings['time_point'], :])
+            point['avg_dtt'] = np.array(self.current_sweep.avg_data[settings['time_point'], :])
+            point['avg_error'] = self.current_sweep.avg_error(settings['time_point'])
+        return point
+
+    def check_precision(self, probe, reference, first_pixel, num_pixels, settings):
+        """
+        processes the shot block again at both precisions, through the same
+        class and options as the run, and keeps the largest dtt difference
+        with the metadata of the run
+        """
+        self.precision_checked = True
+        absolute, relative = check_precision(probe,
+                                             reference,
+                                             first_pixel,
+                                             num_pixels,
+                                             settings['threshold'],
+                                             processing_class=FusedProcessing,
+                                             tau_flip_request=settings['tau_flip_request'],
+                                             linear_corr=settings['linear_corr'],
+                                             bgd=settings['bgd'],
+                                             refman=settings['refman'],
+                                             use_reference=settings['use_reference'],
+                                             use_avg_off_shots=settings['use_avg_off_shots'])
+        self.current_sweep.add_metadata('float32 dtt deviation', absolute)
+        self.current_sweep.add_metadata('float32 dtt deviation / shot noise', relative)
+        self.message.emit('float32 dtt deviation from float64: {0:.2e} of shot noise'.format(relative))
+        return
+
+    start_next_sweep = pyqtSignal(object, bool)
+    sweep_ready = pyqtSignal()
+    @pyqtSlot(object, bool)
+    def next_sweep(self, waves, save):
+        """
+        hands a snapshot of the finished sweep, with the spectra of its last
+        point, to the writer thread and starts the next sweep without waiting
+        for the disk. failed saves are reported through write_failed
+        """
+        if save is True:
+            self.current_sweep.save_sweep(waves,
+                                          self.current_data.probe_on,
+                                          self.current_data.reference_on,
+                                          self.current_data.probe_shot_error)
+        self.current_sweep.next_sweep()
+        self.sweep_ready.emit()
+        return
+
+    @pyqtSlot()
+    def close(self):
+        """
+        flushes the writer and closes the file of the run, connected directly
+        to the finished signal of the processing thread so it runs there
+        """
+        if self.current_sweep is not None:
+            self.current_sweep.close()
+        return
@@ -16,7 +16,12 @@ pg.setConfigOption('foreground', 'k')
 import numpy as np
 import pandas as pd
 from dtt import DataProcessing
+from fused import processing_dtype
+from processing import Processing
 from sweeps import SweepProcessing
+from engine import MeasurementEngine, calculate_times_exponential
+from plotting import PlotModel
+from history import HistoryLog
 
 # hardware
 from cameras import StresingCameras, Acquisition
@@ -25,7 +30,7 @@ from delays import PILongStageDelay, PIShortStageDelay, InnolasPinkLaserDelay
 # motors
 import motormove as mm
 import serial.tools.list_ports
-from time import sleep
+from time import sleep, perf_counter
 
 # metadata
 import datetime
@@ -46,6 +51,10 @@ class Application(QtGui.QMainWindow):
         self.ui.diagnostics_tab.setEnabled(False)
         self.ui.acquisition_tab.setEnabled(False)
         self.ui.motor_tab.setEnabled(False)
+        self.history = HistoryLog([self.ui.a_history, self.ui.d_history])
+        self.history_timer = QtCore.QTimer()
+        self.history_timer.timeout.connect(self.history.flush)
+        self.history_timer.start(250)
         self.last_instance_filename = last_instance_filename
         self.last_instance_values = last_instance_values
         self.preloaded = preloaded
@@ -58,6 +67,16 @@ class Application(QtGui.QMainWindow):
         self.xlabel = 'Wavelength / Pixel'
         self.datafolder = os.path.join(os.path.expanduser('~'), 'Documents')
         self.timefile_folder = os.path.join(os.path.expanduser('~'), 'Documents')
+        self.resumed_sweep = None
+        self.engine = None
+        self.plot_model = None
+        self.diagnostics_on = False
+        self.last_timestep = -1  # last time point of the sweep that has come back, the camera is already on the next one
+        self.colourmap_rows = None  # time points changed since the colour map was drawn, None to draw it all
+        self.stale_plots = set()  # tabs whose plots are behind the latest point
+        self.plot_holdoff = 0
+        self.plot_timer = QtCore.QTimer()
+        self.plot_timer.timeout.connect(self.refresh_plots)
         self.initialize_gui_values()
         self.setup_gui_connections()
         self.main_thread = QtCore.QThread.currentThread()
@@ -127,6 +146,10 @@ class Application(QtGui.QMainWindow):
         self.use_logscale = False
         self.ui.d_use_linear_corr.setChecked(False)
         self.ui.d_use_reference.setChecked(True)
+        self.ui.d_use_float32.setChecked(False)
+        if processing_dtype(np.float32) is not np.float32:
+            self.ui.d_use_float32.setEnabled(False)  # numba always works in float64
+            self.ui.d_use_float32.setToolTip('numba processing is always float64')
         self.ui.coosc_stop_button.setEnabled(False)
         self.ui.move_stop_button.setEnabled(False)
         # file
@@ -171,6 +194,7 @@ class Application(QtGui.QMainWindow):
             self.ui.d_jogstep_sb.setValue(0.01)
             self.ui.d_use_linear_corr.setChecked(0)
             self.ui.d_dcshotfactor_sb.setValue(3)
+            self.ui.a_max_plot_rate.setValue(10)
         else:
             self.ui.a_use_cutoff.setChecked(int(self.last_instance_values['use cutoff']))
             self.ui.a_cutoff_pixel_low.setValue(int(self.last_instance_values['cutoff pixel low']))
@@ -227,6 +251,7 @@ class Application(QtGui.QMainWindow):
             self.ui.coosc_m2_target2.setValue(self.last_instance_values['motor coosc 2 target 2'])
             self.ui.delay_spin.setValue(self.last_instance_values['motor coosc delay'])
             self.ui.move_target_spin.setValue(self.last_instance_values['motor move target'])
+            self.ui.a_max_plot_rate.setValue(int(self.last_instance_values.get('max plot rate', 10)))
             self.ui.d_dcshotfactor_sb.setValue(int(self.last_instance_values['dark correction shot factor']))
         
     def setup_gui_connections(self):
@@ -268,8 +293,10 @@ class Application(QtGui.QMainWindow):
         # acquisition launch
         self.ui.a_run_btn.clicked.connect(self.exec_run_btn)
         self.ui.a_stop_btn.clicked.connect(self.exec_stop_btn)
+        self.ui.a_resume_btn.clicked.connect(self.exec_resume_btn)
         # acquisition plot options
         self.ui.a_plot_log_t_cb.toggled.connect(self.update_plot_log_t)
+        self.ui.a_max_plot_rate.valueChanged.connect(self.update_max_plot_rate)
         # diagnostics reference manipulation
         self.ui.d_refman_vertical_stretch.valueChanged.connect(self.update_refman)
         self.ui.d_refman_vertical_offset.valueChanged.connect(self.update_refman)
@@ -303,6 +330,7 @@ class Application(QtGui.QMainWindow):
         self.ui.d_threshold_pixel.valueChanged.connect(self.update_threshold)
         self.ui.d_threshold_value.valueChanged.connect(self.update_threshold)
         self.ui.d_set_linear_corr_btn.clicked.connect(self.exec_d_set_linear_corr_btn)
+        self.ui.d_use_float32.toggled.connect(self.update_precision)
         # diagnostics launch
         self.ui.d_run_btn.clicked.connect(self.exec_d_run_btn)
         self.ui.d_stop_btn.clicked.connect(self.exec_d_stop_btn)
@@ -356,8 +384,10 @@ class Application(QtGui.QMainWindow):
         self.update_num_shots()
         self.update_num_sweeps()
         self.update_plot_log_t()
+        self.update_max_plot_rate()
         self.update_refman()
         self.update_threshold()
+        self.update_precision()
         self.update_use_calib()
         self.update_use_cutoff()
         self.update_d_time()
@@ -416,6 +446,7 @@ class Application(QtGui.QMainWindow):
         self.last_instance_values['motor move index'] = self.ui.motor_move_index_spin.currentText()
         self.last_instance_values['motor move target'] = self.ui.move_target_spin.value()
         self.last_instance_values['dark correction shot factor'] = self.ui.d_dcshotfactor_sb.value()
+        self.last_instance_values['max plot rate'] = self.ui.a_max_plot_rate.value()
         self.last_instance_values.to_csv(self.last_instance_filename, sep=':', header=False)
         
     def exec_h_camera_connect_btn(self):
@@ -605,6 +636,7 @@ class Application(QtGui.QMainWindow):
         self.metadata['ref manip horizontal offset'] = self.refman[2]
         self.metadata['ref manip scale centre'] = self.refman[3]
         self.metadata['ref manip scale factor'] = self.refman[4]
+        self.metadata['precision'] = np.dtype(self.dtype).name
         
         
     def update_use_timefile(self):
@@ -639,7 +671,7 @@ class Application(QtGui.QMainWindow):
         num_points = self.ui.a_num_tpoints_sb.value()
         times = np.linspace(start_time, end_time, num_points)
         if distribution == 'Exponential':
-            times = self.calculate_times_exponential(start_time, end_time, num_points)
+            times = calculate_times_exponential(start_time, end_time, num_points)
         self.times = times
         self.display_times()
         return
@@ -680,15 +712,6 @@ class Application(QtGui.QMainWindow):
             self.ui.a_times_list.appendPlainText('{0:.2f}'.format(time))
         return
     
-    @staticmethod
-    def calculate_times_exponential(start_time, end_time, num_points):
-        num_before_zero = 10
-        step = 0.1
-        before_zero = np.linspace(start_time, 0, num_before_zero, endpoint=False)
-        zero_onwards = np.geomspace(step, end_time+step, num_points-num_before_zero)-step
-        times = np.concatenate((before_zero, zero_onwards))
-        return times
-    
     def update_d_time_box_limits(self):
         self.ui.d_time.setMaximum(self.delay.tmax)
         self.ui.d_time.setMinimum(self.delay.tmin)
@@ -769,12 +792,14 @@ class Application(QtGui.QMainWindow):
         self.use_calib = self.ui.a_use_calib.isChecked()
         self.ui.d_use_calib.setChecked(self.use_calib)
         self.update_xlabel()
+        self.update_plot_model()
         return
         
     def update_d_use_calib(self):
         self.use_calib = self.ui.d_use_calib.isChecked()
         self.ui.a_use_calib.setChecked(self.use_calib)
         self.update_xlabel()
+        self.update_plot_model()
         return
     
     def update_a_dcshotfactor(self): # Via Acquisition tab
@@ -812,6 +837,7 @@ class Application(QtGui.QMainWindow):
         self.ui.d_calib_pixel_high.setValue(self.calib[1])
         self.ui.d_calib_wave_low.setValue(self.calib[2])
         self.ui.d_calib_wave_high.setValue(self.calib[3])
+        self.update_plot_model()
         return
         
     def update_d_calib(self):
@@ -823,16 +849,19 @@ class Application(QtGui.QMainWindow):
         self.ui.a_calib_pixel_high.setValue(self.calib[1])
         self.ui.a_calib_wave_low.setValue(self.calib[2])
         self.ui.a_calib_wave_high.setValue(self.calib[3])
+        self.update_plot_model()
         return
              
     def update_use_cutoff(self):
         self.use_cutoff = self.ui.a_use_cutoff.isChecked()
         self.ui.d_use_cutoff.setChecked(self.use_cutoff)
+        self.update_plot_model()
         return
         
     def update_d_use_cutoff(self):
         self.use_cutoff = self.ui.d_use_cutoff.isChecked()
         self.ui.a_use_cutoff.setChecked(self.use_cutoff)
+        self.update_plot_model()
         return
              
     def update_cutoff(self):
@@ -841,6 +870,7 @@ class Application(QtGui.QMainWindow):
                            self.ui.a_cutoff_pixel_high.value()]
             self.ui.d_cutoff_pixel_low.setValue(self.cutoff[0])
             self.ui.d_cutoff_pixel_high.setValue(self.cutoff[1])
+            self.update_plot_model()
         else:
             self.append_history('Cutoff Values Incompatible')
         return
@@ -851,6 +881,7 @@ class Application(QtGui.QMainWindow):
                            self.ui.d_cutoff_pixel_high.value()]
             self.ui.a_cutoff_pixel_low.setValue(self.cutoff[0])
             self.ui.a_cutoff_pixel_high.setValue(self.cutoff[1])
+            self.update_plot_model()
         else:
             self.append_history('Cutoff Values Incompatible')
         return
@@ -859,6 +890,10 @@ class Application(QtGui.QMainWindow):
         self.use_logscale = self.ui.a_plot_log_t_cb.isChecked()
         return
         
+    def update_max_plot_rate(self):
+        self.plot_timer.start(int(1000/self.ui.a_max_plot_rate.value()))
+        return
+        
     def update_refman(self):
         self.refman = [self.ui.d_refman_vertical_stretch.value(),
                        self.ui.d_refman_vertical_offset.value(),
@@ -872,6 +907,10 @@ class Application(QtGui.QMainWindow):
                           self.ui.d_threshold_value.value()]
         return
         
+    def update_precision(self):
+        self.dtype = processing_dtype(np.float32 if self.ui.d_use_float32.isChecked() else np.float64)
+        return
+        
     def update_d_time(self):
         self.d_time = self.ui.d_time.value()
         return
@@ -890,8 +929,7 @@ class Application(QtGui.QMainWindow):
         return
         
     def append_history(self, message):
-        self.ui.a_history.appendPlainText(message)
-        self.ui.d_history.appendPlainText(message)
+        self.history.append(message)
         return
                        
     def create_plots(self):
@@ -922,63 +960,102 @@ class Application(QtGui.QMainWindow):
         self.ui.d_probe_ref_graph.plotItem.setLabels(left='Counts', bottom=self.xlabel)
         self.ui.d_probe_ref_graph.plotItem.showAxis('top', show=True)
         self.ui.d_probe_ref_graph.plotItem.showAxis('right', show=True)
-        
-        self.probe_error_region = pg.FillBetweenItem(brush=(255, 0, 0, 50))
-        #self.ui.d_probe_ref_graph.addItem(self.probe_error_region)
-        self.ref_error_region = pg.FillBetweenItem(brush=(0, 0, 255, 50))
-        #self.ui.d_probe_ref_graph.addItem(self.ref_error_region)
         return
     
-    def set_waves_and_times_axes(self):
-        # wavelength/pixel axes
+    def create_acquisition_curves(self):
+        """
+        the curves of the acquisition tab, made once at the start of a run,
+        the plots only give them new data afterwards
+        """
+        self.ui.a_last_shot_graph.plotItem.clear()
+        self.ls_curve = self.ui.a_last_shot_graph.plotItem.plot(pen='b')
+        self.ui.a_kinetic_graph.plotItem.clear()
+        self.kin_current_curve = self.ui.a_kinetic_graph.plotItem.plot(pen='c', symbol='s', symbolPen='c', symbolBrush=None, symbolSize=4)
+        self.kin_avg_curve = self.ui.a_kinetic_graph.plotItem.plot(pen='b', symbol='s', symbolPen='b', symbolBrush=None, symbolSize=4)
+        self.kinetic_error_bars = pg.ErrorBarItem(pen='b', beam=0)
+        self.ui.a_kinetic_graph.plotItem.addItem(self.kinetic_error_bars)
+        self.ui.a_spectra_graph.plotItem.clear()
+        self.spec_curve = self.ui.a_spectra_graph.plotItem.plot(pen='r')
+        return
+    
+    def create_diagnostics_curves(self):
+        """
+        the curves of the diagnostics tab, made once at the start of a run or
+        diagnostics, the plots only give them new data afterwards
+        """
+        self.ui.d_last_shot_graph.plotItem.clear()
+        self.d_ls_curve = self.ui.d_last_shot_graph.plotItem.plot(pen='b')
+        self.ui.d_error_graph.plotItem.clear()
+        self.probe_error_curve = self.ui.d_error_graph.plotItem.plot(pen='r', fillBrush='r')
+        self.ref_error_curve = self.ui.d_error_graph.plotItem.plot(pen='b', fillBrush='b')
+        self.dtt_error_curve = self.ui.d_error_graph.plotItem.plot(pen='g', fillBrush='g')
+        self.ui.d_error_graph.plotItem.setYRange(-4, 1, padding=0)
+        self.ui.d_trigger_graph.plotItem.clear()
+        self.shot_numbers = np.arange(self.num_shots)
+        self.trigger_curve = self.ui.d_trigger_graph.plotItem.plot(pen=None, symbol='o')
+        self.ui.d_probe_ref_graph.plotItem.clear()
+        self.probe_curve = self.ui.d_probe_ref_graph.plotItem.plot(pen='r')
+        self.probe_lower_curve = pg.PlotDataItem(pen='r')  # edges of the error regions, not drawn themselves
+        self.probe_upper_curve = pg.PlotDataItem(pen='r')
+        self.probe_error_region = pg.FillBetweenItem(self.probe_lower_curve, self.probe_upper_curve, brush=(255, 0, 0, 50))
+        self.ui.d_probe_ref_graph.addItem(self.probe_error_region)
+        self.reference_curve = self.ui.d_probe_ref_graph.plotItem.plot(pen='b')
+        self.reference_lower_curve = pg.PlotDataItem(pen='b')
+        self.reference_upper_curve = pg.PlotDataItem(pen='b')
+        self.ref_error_region = pg.FillBetweenItem(self.reference_lower_curve, self.reference_upper_curve, brush=(0, 0, 255, 50))
+        self.ui.d_probe_ref_graph.addItem(self.ref_error_region)
+        return
+    
+    def create_plot_model(self):
+        """
+        axes and cutoff of the plots, fixed until the next run
+        """
         self.waves = self.pixels_to_waves()
-        if self.use_calib is True:
-            self.plot_waves = self.pixels_to_waves()
-        else:
-            self.plot_waves = np.linspace(0, self.num_pixels-1,  self.num_pixels)
-        # time axis
-        self.plot_times = self.times
+        self.plot_model = PlotModel(self.waves,
+                                    self.times,
+                                    use_calib=self.use_calib,
+                                    cutoff=self.cutoff if self.use_cutoff is True else None)
+        self.plot_waves = self.plot_model.plot_waves
+        self.plot_times = self.plot_model.plot_times
         return
         
-    def create_plot_waves_and_times(self):
-        self.set_waves_and_times_axes()
-
-        if not self.diagnostics_on:
-            self.plot_kinetic_avg = self.current_sweep.avg_data[:, self.kinetics_pixel]
-            self.plot_kinetic_current = self.current_sweep.current_data[:, self.kinetics_pixel]
+    def update_plot_model(self):
+        """
+        calibration and cutoff can only change during diagnostics, the plots take them from the next point
+        """
+        if (self.diagnostics_on is True) and (self.idle is False):
+            self.create_plot_model()
+        return
         
+    def create_plot_waves_and_times(self):
+        """
+        points the plots at the latest point, cut like the views of the plot model
+        """
+        cut = self.plot_model.cut
         if self.diagnostics_on is False:
-            self.plot_dtt = self.current_sweep.avg_data[:]
+            self.set_kinetic_views()
+            self.plot_dtt = self.plot_model.dtt
             
-        self.plot_ls = self.current_data.dtt[:]
-        self.plot_probe_shot_error = self.current_data.probe_shot_error[:]
+        self.plot_ls = self.point['dtt'][cut]
+        self.plot_probe_shot_error = self.point['probe_shot_error'][cut]
         
         if self.ui.d_use_reference.isChecked() is True:
-            self.plot_ref_shot_error = self.current_data.ref_shot_error[:]
-            self.plot_dtt_error = self.current_data.dtt_error[:]
+            self.plot_ref_shot_error = self.point['ref_shot_error'][cut]
+            self.plot_dtt_error = self.point['dtt_error'][cut]
             
-        self.plot_probe_on = self.current_data.probe_on[:]
-        self.plot_reference_on = self.current_data.reference_on[:]
-        self.plot_probe_on_array = self.current_data.probe_on_array[:]
-        self.plot_reference_on_array = self.current_data.reference_on_array[:]
+        self.plot_probe_on = self.point['probe_on'][cut]
+        self.plot_reference_on = self.point['reference_on'][cut]
+        self.plot_probe_std = self.point['probe_std'][cut]
+        self.plot_reference_std = self.point['reference_std'][cut]
+        return
         
-        if self.use_cutoff is True:
-            self.plot_waves = self.plot_waves[self.cutoff[0]:self.cutoff[1]]
-            
-            if self.diagnostics_on is False:
-                self.plot_dtt = self.plot_dtt[:,self.cutoff[0]:self.cutoff[1]]
-                
-            self.plot_ls = self.plot_ls[self.cutoff[0]:self.cutoff[1]]
-            self.plot_probe_shot_error = self.plot_probe_shot_error[self.cutoff[0]:self.cutoff[1]]
-            
-            if self.ui.d_use_reference.isChecked() is True:
-                self.plot_ref_shot_error = self.plot_ref_shot_error[self.cutoff[0]:self.cutoff[1]]
-                self.plot_dtt_error = self.plot_dtt_error[self.cutoff[0]:self.cutoff[1]]
-                
-            self.plot_probe_on = self.plot_probe_on[self.cutoff[0]:self.cutoff[1]]
-            self.plot_reference_on = self.plot_reference_on[self.cutoff[0]:self.cutoff[1]]
-            self.plot_probe_on_array = self.plot_probe_on_array[:,self.cutoff[0]:self.cutoff[1]]
-            self.plot_reference_on_array = self.plot_reference_on_array[:,self.cutoff[0]:self.cutoff[1]]        
+    def set_kinetic_views(self):
+        """
+        the kinetics at the marked wavelength, views into the run data kept by the plot model
+        """
+        self.plot_kinetic_avg = self.plot_model.kinetic_avg
+        self.plot_kinetic_avg_error = self.plot_model.kinetic_avg_error
+        self.plot_kinetic_current = self.plot_model.kinetic_current
         return
         
     def pixels_to_waves(self):
@@ -987,11 +1064,16 @@ class Application(QtGui.QMainWindow):
         return np.linspace(0,self.num_pixels-1,self.num_pixels)*slope+y_int
                 
     def ls_plot(self):
-        self.ui.a_last_shot_graph.plotItem.plot(self.plot_waves, self.plot_ls, clear=True, pen='b')
+        self.ls_curve.setData(self.plot_waves, self.plot_ls)
         return
         
     def top_plot(self):
-        self.ui.a_colourmap.setImage(self.plot_dtt, scale=(len(self.plot_waves)/len(self.times), 1))
+        if self.colourmap_rows is None:
+            self.ui.a_colourmap.set_image(self.plot_dtt, scale=(len(self.plot_waves)/len(self.times), 1))
+        else:
+            for row in self.colourmap_rows:
+                self.ui.a_colourmap.set_row(row, self.plot_dtt[row])
+        self.colourmap_rows = set()
         return
     
     def add_time_marker(self):
@@ -1005,10 +1087,9 @@ class Application(QtGui.QMainWindow):
     
     def update_time_pixel(self):
         self.spectrum_time = self.time_marker.value()
-        self.time_pixel = np.where((self.plot_times-self.spectrum_time)**2 == min((self.plot_times-self.spectrum_time)**2))[0][0]
-        if self.finished_acquisition:
-            self.create_plot_waves_and_times()
-            self.spec_plot()
+        self.time_pixel = self.plot_model.time_index(self.spectrum_time)
+        if self.finished_acquisition and (self.diagnostics_on is False):
+            self.spec_plot()  # plot_dtt is a view of the average, only the spectrum changes
         return
     
     def add_wavelength_marker(self):
@@ -1021,63 +1102,80 @@ class Application(QtGui.QMainWindow):
     
     def update_kinetics_wavelength(self):
         self.kinetics_wavelength = self.wavelength_marker.value()
-        self.kinetics_pixel = np.where((self.waves-self.kinetics_wavelength)**2 == min((self.waves-self.kinetics_wavelength)**2))[0][0]  # self.waves rather than self.plot_waves?
-        if self.finished_acquisition:
-            self.create_plot_waves_and_times()
+        self.kinetics_pixel = self.plot_model.wavelength_index(self.kinetics_wavelength)
+        self.plot_model.set_kinetics_pixel(self.kinetics_pixel)
+        if self.finished_acquisition and (self.diagnostics_on is False):
+            self.set_kinetic_views()
             self.kin_plot()
         return
         
     def kin_plot(self):
-        for item in self.ui.a_kinetic_graph.plotItem.listDataItems():
-            self.ui.a_kinetic_graph.plotItem.removeItem(item)
         if self.finished_acquisition:
-            self.ui.a_kinetic_graph.plotItem.plot(self.plot_times, self.plot_kinetic_avg, pen='b', symbol='s', symbolPen='b', symbolBrush=None, symbolSize=4, clear=False)
+            self.kin_current_curve.setVisible(False)
+            self.kin_avg_curve.setData(self.plot_times, self.plot_kinetic_avg)
+            self.kin_avg_curve.setVisible(True)
+            self.kin_error_plot()
         else:
-            if self.current_sweep.sweep_index > 0:
-                self.ui.a_kinetic_graph.plotItem.plot(self.plot_times[0:self.timestep+1], self.plot_kinetic_current[0:self.timestep+1], pen='c', symbol='s', symbolPen='c', symbolBrush=None, symbolSize=4, clear=False)
-                self.ui.a_kinetic_graph.plotItem.plot(self.plot_times, self.plot_kinetic_avg, pen='b', symbol='s', symbolPen='b', symbolBrush=None, symbolSize=4, clear=False)
+            self.kin_current_curve.setData(self.plot_times[0:self.last_timestep+1], self.plot_kinetic_current[0:self.last_timestep+1])
+            self.kin_current_curve.setVisible(True)
+            if self.sweep_index > 0:
+                self.kin_avg_curve.setData(self.plot_times, self.plot_kinetic_avg)
+                self.kin_avg_curve.setVisible(True)
+                self.kin_error_plot()
             else:
-                self.ui.a_kinetic_graph.plotItem.plot(self.plot_times[0:self.timestep+1], self.plot_kinetic_current[0:self.timestep+1], pen='c', symbol='s', symbolPen='c', symbolBrush=None, symbolSize=4, clear=False)
+                self.kin_avg_curve.setVisible(False)
+                self.kinetic_error_bars.setVisible(False)
+        return
+        
+    def kin_error_plot(self):
+        """
+        standard error of the average across sweeps, only where a time point has two sweeps
+        """
+        has_error = np.isfinite(self.plot_kinetic_avg_error)
+        if has_error.any():
+            self.kinetic_error_bars.setData(x=np.asarray(self.plot_times)[has_error], y=self.plot_kinetic_avg[has_error], height=2*self.plot_kinetic_avg_error[has_error])
+            self.kinetic_error_bars.setVisible(True)
+        else:
+            self.kinetic_error_bars.setVisible(False)
         return
         
     def spec_plot(self):
-        for item in self.ui.a_spectra_graph.plotItem.listDataItems():
-            self.ui.a_spectra_graph.plotItem.removeItem(item)
-        self.ui.a_spectra_graph.plotItem.plot(self.plot_waves, self.plot_dtt[self.time_pixel,:], pen='r', clear=False)
+        self.spec_curve.setData(self.plot_waves, self.plot_dtt[self.time_pixel,:])
         return
         
     def d_error_plot(self):
-        self.ui.d_error_graph.plotItem.plot(self.plot_waves, np.log10(self.plot_probe_shot_error), pen='r', clear=True, fillBrush='r')
-        if self.ui.d_use_reference.isChecked() is True:         
-            self.ui.d_error_graph.plotItem.plot(self.plot_waves, np.log10(self.plot_ref_shot_error), pen='b', clear=False, fillBrush='b')    
-            self.ui.d_error_graph.plotItem.plot(self.plot_waves, np.log10(self.plot_dtt_error), pen='g', clear=False, fillBrush='g')
-        self.ui.d_error_graph.plotItem.setYRange(-4, 1, padding=0)
+        self.probe_error_curve.setData(self.plot_waves, np.log10(self.plot_probe_shot_error))
+        use_reference = self.ui.d_use_reference.isChecked()
+        if use_reference is True:
+            self.ref_error_curve.setData(self.plot_waves, np.log10(self.plot_ref_shot_error))
+            self.dtt_error_curve.setData(self.plot_waves, np.log10(self.plot_dtt_error))
+        self.ref_error_curve.setVisible(use_reference)
+        self.dtt_error_curve.setVisible(use_reference)
         return
         
     def d_trigger_plot(self):
-        self.ui.d_trigger_graph.plotItem.plot(np.arange(self.num_shots), self.current_data.trigger, pen=None, symbol='o', clear=True)
+        if self.shot_numbers.size != self.point['trigger'].size:
+            self.shot_numbers = np.arange(self.point['trigger'].size)
+        self.trigger_curve.setData(self.shot_numbers, self.point['trigger'])
         return
         
     def d_probe_ref_plot(self):
-        for item in self.ui.d_probe_ref_graph.plotItem.listDataItems():
-            self.ui.d_probe_ref_graph.plotItem.removeItem(item)
-        probe_std = np.std(self.plot_probe_on_array, axis=0)
-        self.ui.d_probe_ref_graph.plotItem.plot(self.plot_waves, self.plot_probe_on, pen='r')
-        pcurve1 = pg.PlotDataItem(self.plot_waves, self.plot_probe_on-2*probe_std, pen='r')
-        pcurve2 = pg.PlotDataItem(self.plot_waves, self.plot_probe_on+2*probe_std, pen='r')
-        self.probe_error_region.setCurves(pcurve1, pcurve2)
-        self.ui.d_probe_ref_graph.addItem(self.probe_error_region)            
-        if self.ui.d_use_reference.isChecked() is True:
-            ref_std = np.std(self.plot_reference_on_array, axis=0)
-            self.ui.d_probe_ref_graph.plotItem.plot(self.plot_waves, self.plot_reference_on, pen='b')
-            rcurve1 = pg.PlotDataItem(self.plot_waves, self.plot_reference_on-2*ref_std, pen='b')
-            rcurve2 = pg.PlotDataItem(self.plot_waves, self.plot_reference_on+2*ref_std, pen='b')
-            self.ref_error_region.setCurves(rcurve1, rcurve2)
-            self.ui.d_probe_ref_graph.addItem(self.ref_error_region)
+        probe_std = self.plot_probe_std
+        self.probe_curve.setData(self.plot_waves, self.plot_probe_on)
+        self.probe_lower_curve.setData(self.plot_waves, self.plot_probe_on-2*probe_std)
+        self.probe_upper_curve.setData(self.plot_waves, self.plot_probe_on+2*probe_std)
+        use_reference = self.ui.d_use_reference.isChecked()
+        if use_reference is True:
+            ref_std = self.plot_reference_std
+            self.reference_curve.setData(self.plot_waves, self.plot_reference_on)
+            self.reference_lower_curve.setData(self.plot_waves, self.plot_reference_on-2*ref_std)
+            self.reference_upper_curve.setData(self.plot_waves, self.plot_reference_on+2*ref_std)
+        self.reference_curve.setVisible(use_reference)
+        self.ref_error_region.setVisible(use_reference)
         return
         
     def d_ls_plot(self):
-        self.ui.d_last_shot_graph.plotItem.plot(self.plot_waves, self.plot_ls, pen='b', clear=True)
+        self.d_ls_curve.setData(self.plot_waves, self.plot_ls)
         return
         
     def message_block(self):
@@ -1126,8 +1224,10 @@ class Application(QtGui.QMainWindow):
         
     def running(self):
         self.idle = False
+        self.stale_plots.clear()
         self.ui.hardware_tab.setEnabled(False)
         self.ui.a_run_btn.setDisabled(True)
+        self.ui.a_resume_btn.setDisabled(True)
         self.ui.d_run_btn.setDisabled(True)
         self.ui.a_file_box.setDisabled(True)
         self.ui.a_times_box.setDisabled(True)
@@ -1147,6 +1247,7 @@ class Application(QtGui.QMainWindow):
         self.idle = True
         self.ui.hardware_tab.setEnabled(True)
         self.ui.a_run_btn.setDisabled(False)
+        self.ui.a_resume_btn.setDisabled(False)
         self.ui.d_run_btn.setDisabled(False)
         self.ui.a_file_box.setDisabled(False)
         self.ui.a_times_box.setDisabled(False)
@@ -1209,105 +1310,140 @@ class Application(QtGui.QMainWindow):
         
     def update_progress_bars(self):
         self.ui.a_sweep_progress_bar.setValue(self.timestep+1)
-        self.ui.a_measurement_progress_bar.setValue((len(self.times)*self.current_sweep.sweep_index)+self.timestep+1)
+        self.ui.a_measurement_progress_bar.setValue((len(self.times)*self.sweep_index)+self.timestep+1)
         return
         
-    def acquire(self):
-        self.append_history('Acquiring '+str(self.num_shots)+' shots')
-        self.acquisition.start_acquire.emit()  # connects to the Acquire signal in the camera class, which results in a signal data_ready being emitted containing the data from probe and reference. This signal connects to post_acquire method, which loops back to acquire
-        return
-    
-    @pyqtSlot(np.ndarray, np.ndarray, int, int)    
-    def post_acquire(self, probe, reference, first_pixel, num_pixels):
-        try:
-            self.current_data.update(probe,
-                                     reference,
-                                     first_pixel,
-                                     num_pixels)
-        except:
-             self.current_data = DataProcessing(probe,
-                                                reference,
-                                                first_pixel,
-                                                num_pixels)
+    def processing_options(self):
+        """
+        the processing options set in the gui, for the processing thread
+        which cannot read the widgets itself
+        """
+        linear_corr = None
         if self.ui.d_use_linear_corr.isChecked():
             try:
-                self.current_data.linear_pixel_correlation(self.linear_corr)
+                linear_corr = (self.linear_corr[0], self.linear_corr[1])
             except:
                 self.append_history('Error using linear pixel correction, line~1075')
-        self.high_trig_std = self.current_data.separate_on_off(self.threshold, self.tau_flip_request)
-        if self.ui.a_test_run_btn.isChecked() is False:
-            self.current_data.sub_bgd(self.bgd)
-        if self.ui.d_use_ref_manip.isChecked() is True:
-            self.current_data.manipulate_reference(self.refman)
-        self.current_data.average_shots()
-        if self.ui.d_use_reference.isChecked() is True:
-            self.current_data.correct_probe_with_reference()
-            self.current_data.average_refd_shots()
-            self.high_dtt = self.current_data.calcuate_dtt(use_reference=True, cutoff=self.cutoff, use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked(), max_dtt=np.abs(self.ui.d_max_dtt.value()))
-            self.current_data.calculate_dtt_error(use_reference=True ,use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
-        else:
-            self.high_dtt = self.current_data.calcuate_dtt(use_reference=False,cutoff=self.cutoff, use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked(), max_dtt=np.abs(self.ui.d_max_dtt.value()))
-            self.current_data.calculate_dtt_error(use_reference=False, use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
-        if (self.high_trig_std is False) and (self.high_dtt is False):
-            self.current_sweep.add_current_data(self.current_data.dtt, time_point=self.timestep)
-            self.create_plot_waves_and_times()
-            if self.ui.acquisition_tab.isVisible() is True:
-                self.ls_plot()
-                self.top_plot()
-                self.kin_plot()
-                self.spec_plot()
-            if self.ui.diagnostics_tab.isVisible() is True:
-                self.d_ls_plot()
-                self.d_error_plot()
-                self.d_trigger_plot()
-                self.d_probe_ref_plot()
-            if self.stop_request is True:
-                self.finish()
-            if self.timestep == len(self.times)-1:
-                self.post_sweep()
-            else:
-                self.timestep = self.timestep+1
-                self.time = self.times[self.timestep]
-                self.ui.a_time_display.display(self.time)
-                self.update_progress_bars()
-                self.move(self.time)
-                self.acquire()
-        else:
-            if self.stop_request is True:
-                self.finish()
-            self.append_history('retaking point')
-            self.acquire()
+        options = {'threshold': self.threshold,
+                   'linear_corr': linear_corr,
+                   'refman': self.refman if self.ui.d_use_ref_manip.isChecked() is True else None,
+                   'use_reference': self.ui.d_use_reference.isChecked(),
+                   'use_avg_off_shots': self.ui.d_use_avg_off_shots.isChecked(),
+                   'cutoff': self.cutoff,
+                   'max_dtt': np.abs(self.ui.d_max_dtt.value()),
+                   'dtype': self.dtype}
+        return options
+    
+    def processing_settings(self, time_point=None):
+        """
+        snapshot of the processing options for a diagnostics point. time_point
+        None means the point is not added to a sweep
+        """
+        settings = self.processing_options()
+        settings.update({'tau_flip_request': self.tau_flip_request,
+                         'bgd': self.bgd,
+                         'time_point': time_point,
+                         'save': False})
+        return settings
+    
+    def run_config(self):
+        """
+        everything the measurement engine needs to know about the run
+        """
+        self.update_metadata()
+        return {'times': self.times,
+                'num_sweeps': self.num_sweeps,
+                'num_shots': self.num_shots,
+                'dcshotfactor': self.dcshotfactor,
+                'filepath': self.filepath,
+                'metadata': self.metadata,
+                'waves': self.waves,
+                'test_run': self.ui.a_test_run_btn.isChecked(),
+                'processing': self.processing_options()}
+    
+    def start_processing_thread(self):
+        self.processing_thread = QtCore.QThread()
+        self.processing_thread.start()
+        
+        self.processing = Processing(self.acquisition)
+        
+        self.processing.moveToThread(self.processing_thread)
+        self.processing_thread.finished.connect(self.processing.close, QtCore.Qt.DirectConnection)
+        self.processing.settings_changed.connect(self.processing.update_settings)
+        self.processing.start_run.connect(self.processing.new_run)
+        self.processing.start_next_sweep.connect(self.processing.next_sweep)
         return
-   
-    def acquire_bgd(self):
-        self.append_history('Acquiring '+str(self.num_shots*self.dcshotfactor)+' shots')
-        self.acquisition.start_acquire.emit()
+    
+    @pyqtSlot(object)    
+    def post_acquire(self, point):
+        self.point = point
+        if (point['high_std'] is False) and (point['high_dtt'] is False):
+            self.sweep_data[point['timestep'], :] = point['sweep_dtt']
+            self.avg_data[point['timestep'], :] = point['avg_dtt']
+            self.avg_error_data[point['timestep'], :] = point['avg_error']
+            self.last_timestep = max(self.last_timestep, point['timestep'])
+            if self.colourmap_rows is not None:
+                self.colourmap_rows.add(point['timestep'])
+            self.stale_plots.update(('acquisition', 'diagnostics'))
         return
     
-    @pyqtSlot(np.ndarray, np.ndarray, int, int)    
-    def post_acquire_bgd(self, probe, reference, first_pixel, num_pixels):      
-        self.message_unblock()
-        self.bgd = DataProcessing(probe,
-                                  reference,
-                                  first_pixel,
-                                  num_pixels)
-        if self.ui.d_use_linear_corr.isChecked():
-            try:
-                self.bgd.linear_pixel_correlation(self.linear_corr)
-            except:
-                self.append_history('Error using linear pixel correction, line~1137')
-        self.bgd.separate_on_off(self.threshold)
-        self.bgd.average_shots() 
-        self.run()          
-        return    
+    def refresh_plots(self, force=False):
+        """
+        runs on the plot timer, so points arriving faster than the maximum
+        plot rate only cost a copy into the mirrors and the latest state is
+        drawn once per tick. only the visible tab is drawn, the other one stays
+        stale until it is shown. when drawing takes longer than a tick the
+        following ticks are skipped until the gui has caught up
+        """
+        if not force and perf_counter() < self.plot_holdoff:
+            return
+        visible = set()
+        if self.ui.acquisition_tab.isVisible() is True:
+            visible.add('acquisition')
+        if self.ui.diagnostics_tab.isVisible() is True:
+            visible.add('diagnostics')
+        to_draw = self.stale_plots & visible
+        if not to_draw:
+            return
+        start = perf_counter()
+        self.create_plot_waves_and_times()
+        if 'acquisition' in to_draw:
+            self.ls_plot()
+            self.top_plot()
+            self.kin_plot()
+            self.spec_plot()
+        if 'diagnostics' in to_draw:
+            self.d_ls_plot()
+            self.d_error_plot()
+            self.d_trigger_plot()
+            self.d_probe_ref_plot()
+        self.stale_plots -= to_draw
+        finish = perf_counter()
+        self.plot_holdoff = finish+max(finish-start-self.plot_timer.interval()*1e-3, 0)
+        return
+    
+    @pyqtSlot(int, int)
+    def post_start_point(self, sweep_index, timestep):
+        if sweep_index != self.sweep_index:
+            self.sweep_index = sweep_index
+            self.sweep_data = np.zeros((len(self.times), self.num_pixels))
+            self.plot_model.set_data(sweep_data=self.sweep_data)
+            self.last_timestep = -1
+            self.ui.a_sweep_display.display(self.sweep_index+1)
+        self.timestep = timestep
+        self.time = self.times[self.timestep]
+        self.ui.a_time_display.display(self.time)
+        self.update_progress_bars()
+        return
     
     def exec_run_btn(self):
+        if self.resumed_sweep is None:  # exec_resume_btn starts it before its own message
+            self.history.start_run()
         if self.ui.a_test_run_btn.isChecked() is True:
             self.append_history('Launching Test Run!')
         else:
             self.append_history('Launching Run!')
         
-        self.stop_request = False
         self.diagnostics_on = False
         self.running()
         self.update_num_shots()
@@ -1315,11 +1451,14 @@ class Application(QtGui.QMainWindow):
         success = self.delay.check_times(self.times)
         if success is False:
             self.message_time_points()
+            self.resumed_sweep = None
             self.idling()
             return
         
         self.finished_acquisition = False
-        self.set_waves_and_times_axes()
+        self.create_plot_model()
+        self.create_acquisition_curves()
+        self.create_diagnostics_curves()
         try:
             self.ui.a_kinetic_graph.removeItem(self.time_marker)
         except:
@@ -1331,89 +1470,93 @@ class Application(QtGui.QMainWindow):
             pass
         self.add_wavelength_marker()
         
-        self.acquire_thread = QtCore.QThread()
-        self.acquire_thread.start()
-        
-        self.acquisition = Acquisition(self.camera, number_of_scans=self.num_shots*self.dcshotfactor)
-        
-        self.acquisition.moveToThread(self.acquire_thread)
-        self.acquisition.start_acquire.connect(self.acquisition.acquire)
-        self.acquisition.data_ready.connect(self.post_acquire_bgd)
-        
-        if self.ui.a_test_run_btn.isChecked() is False:
-            self.message_block()
-            self.append_history('Taking Background')
-            self.acquire_bgd()
+        if self.engine is not None:
+            self.engine.wait()  # the processing thread of the last run may still be closing its file
+        self.engine = MeasurementEngine(self.camera, self.delay, self.run_config())
+        self.engine.message.connect(self.append_history)
+        self.engine.background_started.connect(self.message_block)
+        self.engine.background_taken.connect(self.message_unblock)
+        self.engine.run_started.connect(self.post_start_run)
+        self.engine.point_started.connect(self.post_start_point)
+        self.engine.point_done.connect(self.post_acquire)
+        self.engine.write_failed.connect(self.post_write_error)
+        self.engine.finished.connect(self.finish)
+        resumed_sweep, self.resumed_sweep = self.resumed_sweep, None
+        if resumed_sweep is None:
+            self.last_timestep = -1
+            self.engine.start()
         else:
-            self.run()
+            self.last_timestep = self.resume_timestep-1
+            self.engine.start(resumed_sweep, self.resume_timestep)
         return
             
-    def run(self):
-        self.update_metadata()
-        self.current_sweep = SweepProcessing(self.times,self.num_pixels,self.filepath,self.metadata)    
-        
-        self.acquisition.update_number_of_scans(self.num_shots)
-        self.acquisition.data_ready.disconnect(self.post_acquire_bgd)
-        self.acquisition.data_ready.connect(self.post_acquire)
-        
-        self.append_history('Starting Sweep '+str(self.current_sweep.sweep_index))
-        self.ui.a_sweep_display.display(self.current_sweep.sweep_index+1)
+    def exec_resume_btn(self):
+        """
+        carries on an interrupted run from its file, without retaking the
+        points already saved. uses the times of the file and the current
+        settings for everything else
+        """
+        filename = QtGui.QFileDialog.getOpenFileName(None, 'Select Run To Resume', self.datafolder, 'HDF5 Files (*.hdf5)')[0]
+        if filename == '':
+            return
+        try:
+            resumed_sweep, resume_timestep = SweepProcessing.resume(filename, swmr=True)
+        except:
+            self.append_history('Unable to resume from '+filename)
+            return
+        if resumed_sweep.pixels.size != self.num_pixels:
+            self.append_history('Unable to resume, the file has a different number of pixels')
+            return
+        if resumed_sweep.sweep_index >= self.num_sweeps:
+            self.append_history('Nothing to resume, all sweeps are in the file')
+            return
+        self.resumed_sweep = resumed_sweep
+        self.resume_timestep = resume_timestep
+        self.times = resumed_sweep.times[0, :]
+        self.display_times()
+        self.ui.a_test_run_btn.setChecked(False)
+        self.history.start_run()
+        self.append_history('Resuming '+filename+' at sweep '+str(resumed_sweep.sweep_index)+', time point '+str(resume_timestep))
+        self.exec_run_btn()
+        return
+        
+    @pyqtSlot(object)
+    def post_start_run(self, state):
+        if self.engine.bgd is not None:
+            self.bgd = self.engine.bgd  # so the linear pixel correction can be set from it afterwards
+        self.sweep_index = state['sweep_index']
+        self.sweep_data = state['sweep_data']
+        self.avg_data = state['avg_data']
+        self.avg_error_data = state['avg_error']
+        self.plot_model.set_data(self.avg_data, self.avg_error_data, self.sweep_data)
+        if self.ui.a_test_run_btn.isChecked() is False:
+            self.history.open_file(state['hdf5_filename'])
+        self.colourmap_rows = None
+        self.ui.a_sweep_display.display(self.sweep_index+1)
         self.ui.a_sweep_progress_bar.setMaximum(len(self.times))
         self.ui.a_measurement_progress_bar.setMaximum(len(self.times)*self.num_sweeps)
-        self.start_sweep()
+        return
         
-    def finish(self):
-        self.acquire_thread.quit()
+    @pyqtSlot(bool)
+    def finish(self, stopped):
         self.idling()
+        self.history.close_file()
         self.finished_acquisition = True
-        if not self.stop_request:
-            self.create_plot_waves_and_times()
-            if self.ui.acquisition_tab.isVisible() is True:
-                self.ls_plot()
-                self.top_plot()
-                self.kin_plot()
-                self.spec_plot()
-            if self.ui.diagnostics_tab.isVisible() is True:
-                self.d_ls_plot()
-                self.d_error_plot()
-                self.d_trigger_plot()
-                self.d_probe_ref_plot()
-        return
-        
-    def start_sweep(self):
-        self.timestep = 0
-        self.time = self.times[self.timestep]
-        self.ui.a_time_display.display(self.time)
-        self.update_progress_bars()
-        self.move(self.time)
-        self.acquire()
+        if stopped:
+            self.stale_plots.clear()
+        else:
+            self.stale_plots.update(('acquisition', 'diagnostics'))
+            self.refresh_plots(force=True)
         return
         
-    def post_sweep(self):
-        if self.ui.a_test_run_btn.isChecked() is False:
-            self.append_history('Saving Sweep '+str(self.current_sweep.sweep_index))
-            try:
-                self.current_sweep.save_current_data(self.waves)
-                self.current_sweep.save_avg_data(self.waves)
-                self.current_sweep.save_metadata_each_sweep(self.current_data.probe_on,
-                                                            self.current_data.reference_on,
-                                                            self.current_data.probe_shot_error)
-            except:
-                self.message_error_saving()
-        
-        self.current_sweep.next_sweep()
-        
-        if self.current_sweep.sweep_index == self.num_sweeps:
-            self.finish()
-        else:
-            self.append_history('Starting Sweep '+str(self.current_sweep.sweep_index))
-            self.ui.a_sweep_display.display(self.current_sweep.sweep_index+1)
-            self.start_sweep()
+    @pyqtSlot(str)
+    def post_write_error(self, message):
+        self.append_history(message)
+        self.message_error_saving()
         return
         
     def exec_stop_btn(self):
-        self.append_history('Stopped')
-        self.stop_request=True
+        self.engine.stop()
         return
         
     def move(self, new_time): 
@@ -1447,51 +1590,31 @@ class Application(QtGui.QMainWindow):
    
     def d_acquire(self):
         self.append_history('Acquiring '+str(self.num_shots)+' shots')
+        self.pending_acquisitions = self.pending_acquisitions+1
+        self.processing.settings_changed.emit(self.processing_settings())
         self.acquisition.start_acquire.emit()
         return
         
-    @pyqtSlot(np.ndarray, np.ndarray, int, int)
-    def d_post_acquire(self, probe, reference, first_pixel, num_pixels):
-        try:
-            self.current_data.update(probe,
-                                     reference,
-                                     first_pixel,
-                                     num_pixels)
-        except:
-             self.current_data = DataProcessing(probe,
-                                                reference,
-                                                first_pixel,
-                                                num_pixels)
-        if self.ui.d_use_linear_corr.isChecked():
-            try:
-                self.current_data.linear_pixel_correlation(self.linear_corr)
-            except:
-                self.append_history('Error using linear pixel correction, line~1308')
-        self.current_data.separate_on_off(self.threshold,self.tau_flip_request)
-        if self.ui.a_test_run_btn.isChecked() is False:
-            self.current_data.sub_bgd(self.bgd)
-        if self.ui.d_use_ref_manip.isChecked() is True:
-            self.current_data.manipulate_reference(self.refman)
-        self.current_data.average_shots()
-        if self.ui.d_use_reference.isChecked() is True:
-            self.current_data.correct_probe_with_reference()
-            self.current_data.average_refd_shots()
-            self.current_data.calcuate_dtt(use_reference=True,cutoff=self.cutoff,use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
-            self.current_data.calculate_dtt_error(use_reference=True,use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
+    @pyqtSlot(np.ndarray, np.ndarray, int, int, int)
+    def d_next_acquire(self, probe, reference, first_pixel, num_pixels, buffer_index):
+        if self.stop_request is False:
+            self.d_acquire()  # the next shot block reads out into a free buffer while the processing thread works on this one
+        return
+        
+    @pyqtSlot(object)
+    def d_post_acquire(self, point):
+        self.pending_acquisitions = self.pending_acquisitions-1
+        if 'error' in point:
+            self.append_history(point['error'])
+            self.stop_request = True
         else:
-            self.current_data.calcuate_dtt(use_reference=False,cutoff=self.cutoff,use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
-            self.current_data.calculate_dtt_error(use_reference=False,use_avg_off_shots=self.ui.d_use_avg_off_shots.isChecked())
-
-        self.create_plot_waves_and_times()
-        self.d_ls_plot()
-        self.d_error_plot()
-        self.d_trigger_plot()
-        self.d_probe_ref_plot()
+            self.point = point
+            if point['num_dropped_shots'] > 1:
+                self.append_history('dropped '+str(point['num_dropped_shots'])+' shots')
+            self.stale_plots.add('diagnostics')
         
-        if self.stop_request is True:
+        if (self.stop_request is True) and (self.pending_acquisitions == 0):
             self.d_finish()
-        else:
-            self.d_acquire()
         return
         
     def d_acquire_bgd(self):
@@ -1499,13 +1622,15 @@ class Application(QtGui.QMainWindow):
         self.acquisition.start_acquire.emit()
         return
         
-    @pyqtSlot(np.ndarray, np.ndarray, int, int)
-    def d_post_acquire_bgd(self, probe, reference, first_pixel, num_pixels):      
+    @pyqtSlot(np.ndarray, np.ndarray, int, int, int)
+    def d_post_acquire_bgd(self, probe, reference, first_pixel, num_pixels, buffer_index):      
         self.message_unblock()
         self.bgd = DataProcessing(probe,
                                   reference,
                                   first_pixel,
-                                  num_pixels)
+                                  num_pixels,
+                                  dtype=self.dtype)
+        self.acquisition.release_buffer(buffer_index)
         if self.ui.d_use_linear_corr.isChecked():
             try:
                 self.bgd.linear_pixel_correlation(self.linear_corr)
@@ -1530,6 +1655,8 @@ class Application(QtGui.QMainWindow):
             self.message_time_points()
             self.idling()
             return
+        self.create_plot_model()
+        self.create_diagnostics_curves()
         
         self.acquire_thread = QtCore.QThread()
         self.acquire_thread.start()
@@ -1547,12 +1674,17 @@ class Application(QtGui.QMainWindow):
     def d_run(self):
         self.move(self.d_time)
         self.acquisition.update_number_of_scans(self.num_shots)
+        self.start_processing_thread()
+        self.processing.point_ready.connect(self.d_post_acquire)
         self.acquisition.data_ready.disconnect(self.d_post_acquire_bgd)
-        self.acquisition.data_ready.connect(self.d_post_acquire)
+        self.acquisition.data_ready.connect(self.processing.process)
+        self.acquisition.data_ready.connect(self.d_next_acquire)
+        self.pending_acquisitions = 0
         self.d_acquire()
         
     def d_finish(self):  
         self.acquire_thread.quit()
+        self.processing_thread.quit()
         self.idling()
         return
         
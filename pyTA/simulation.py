@@ -0,0 +1,282 @@
+import time
+import numpy as np
+from PyQt5.QtCore import QObject
+from cameras import StresingCameras
+
+
+def exponential_dtt(delay_time, num_pixels, amplitude=2e-3, lifetime=100.0, rise=0.2):
+    """
+    pump-induced signal used by the simulated camera unless another one is
+    given: a bleach band in the middle of the detector and a weaker induced
+    absorption to the red, rising at time zero and decaying with one lifetime
+    """
+    x = np.linspace(0, 1, num_pixels)
+    spectrum = np.exp(-((x-0.4)/0.08)**2)-0.4*np.exp(-((x-0.7)/0.12)**2)
+    kinetic = np.exp(-max(delay_time, 0)/lifetime)/(1+np.exp(-np.clip(delay_time/rise, -50, 50)))
+    return amplitude*kinetic*spectrum
+
+
+class SimulatedStresingCameras(StresingCameras):
+    """
+    stands in for StresingCameras without the PCI board, e.g. to run or
+    profile the acquisition pipeline on any machine. shot blocks are written
+    into the acquisition buffer in the same layout as DLLReadFFLoop, VIS one
+    shot per row and NIR two shots per row, so _construct_data_vectors and
+    everything downstream run unchanged.
+
+    every shot has a common intensity fluctuation (removed by referencing)
+    and independent pixel noise. the trigger pixel reads high on alternate
+    shots, and pump on shots carry dtt(time) on the probe. with tau_flip the
+    pump lands on the shot after the trigger, as the processing expects when
+    the delay asks for a tau flip. time and tau_flip are read from the delay
+    when one is set. with blocked only the dark counts are left, for the
+    background. blocks are paced at shot_rate (None for no pacing)
+    """
+
+    def __init__(self, cameratype, use_ir_gain=False, shot_rate=1000, dtt=exponential_dtt, noise=1e-3, fluctuation=1e-2, drop_rate=0, trigger_pixel=0, seed=None):
+        super(QObject, self).__init__()
+        self.cameratype = cameratype
+        self.use_ir_gain = use_ir_gain
+        if self.cameratype == 'VIS':
+            self.pixels = 1200  # number of pixels, including dummy pixels
+            self.num_pixels = 1024  # actual number of active pixels
+            self.first_pixel = 16 # first non-dummy pixel
+        elif self.cameratype == 'NIR':
+            self.pixels = 600  # number of pixels, including dummy pixels
+            self.num_pixels = 512  # actual number of active pixels
+            self.first_pixel = 16  # first non-dummy pixel
+        else:
+            raise ValueError('cameratype must be either \'VIS\' or \'NIR\'')
+        self.exposure_time_us = 10  # set an arbitrary default - overridden by Acquisition instance
+        self.number_of_scans = 100  # set an arbitrary default - overridden by Acquisition instance
+        self.shot_rate = shot_rate  # laser repetition rate in Hz
+        self.dtt = dtt  # callable (time, num_pixels) -> dT/T of the active pixels, or None for no pump
+        self.noise = noise  # relative pixel noise of each shot
+        self.fluctuation = fluctuation  # relative shot to shot intensity fluctuation, common to probe and reference
+        self.drop_rate = drop_rate  # probability of a missed trigger before each shot, breaks the chopper parity
+        self.trigger_pixel = trigger_pixel
+        self.trigger_levels = (1000, 30000)  # counts on the trigger pixel when low and high
+        self.delay = None
+        self.time = 0  # delay time used when no delay is set
+        self.tau_flip = False
+        self.blocked = False  # probe and reference blocked, for the background
+        self.random = np.random.RandomState(seed)
+        self.chopper_phase = 0
+        self.overflow = False
+        self._set_spectra()
+
+    def _set_spectra(self):
+        """
+        white light spectra of probe and reference over the active pixels, on top of the dark counts
+        """
+        x = np.linspace(0, 1, self.num_pixels)
+        self.dark_counts = 500.0
+        self.probe_spectrum = np.zeros(self.pixels)
+        self.reference_spectrum = np.zeros(self.pixels)
+        active = slice(self.first_pixel, self.first_pixel+self.num_pixels)
+        self.probe_spectrum[active] += 30000*np.exp(-((x-0.5)/0.35)**2)
+        self.reference_spectrum[active] += 24000*np.exp(-((x-0.45)/0.4)**2)
+        return
+
+    def initialise(self):
+        self.chopper_phase = 0
+        return
+
+    def _wait(self, time_us):
+        time.sleep(time_us*1e-6)
+        return
+
+    def current_time(self):
+        if self.delay is not None:
+            return self.delay.time, self.delay.tau_flip
+        return self.time, self.tau_flip
+
+    def ReadFFLoop(self, number_of_scans, exposure_time_us):
+        start = time.perf_counter()
+        self._construct_data_vectors()
+        num_shots = self.probe.shape[0]
+        self._fill(self.probe, self.reference, self.chopper_phase+10)  # the first 10 reads of the block are discarded
+        self.chopper_phase += num_shots+10
+        if self.shot_rate is not None:
+            remaining = (num_shots+10)/self.shot_rate-(time.perf_counter()-start)
+            if remaining > 0:
+                time.sleep(remaining)
+        return
+
+    def _fill(self, probe, reference, first_shot):
+        num_shots = probe.shape[0]
+        steps = 1+(self.random.random_sample(num_shots) < self.drop_rate)
+        trigger_high = ((first_shot+np.cumsum(steps)) % 2) == 0
+        delay_time, tau_flip = self.current_time()
+        pump_on = ~trigger_high if tau_flip else trigger_high
+        intensity = 1+self.fluctuation*self.random.standard_normal((num_shots, 1))
+        if self.blocked:
+            intensity = np.zeros((num_shots, 1))
+        probe_shots = intensity*self.probe_spectrum+self.dark_counts
+        if self.dtt is not None:
+            active = slice(self.first_pixel, self.first_pixel+self.num_pixels)
+            probe_shots[pump_on, active] *= 1+self.dtt(delay_time, self.num_pixels)
+        probe_shots *= 1+self.noise*self.random.standard_normal(probe_shots.shape)
+        probe_shots[:, self.trigger_pixel] = np.where(trigger_high, self.trigger_levels[1], self.trigger_levels[0])
+        reference_shots = intensity*self.reference_spectrum+self.dark_counts
+        reference_shots *= 1+self.noise*self.random.standard_normal(reference_shots.shape)
+        probe[:] = np.clip(probe_shots, 0, 65535)
+        reference[:] = np.clip(reference_shots, 0, 65535)
+        return
+
+    def FFOvl(self):
+        return False
+
+    def close(self):
+        return
+
+
+class SimulatedStageDelay:
+    """
+    stands in for the PI delay stages without the controller. a move takes
+    distance/velocity plus settle_time, start_move returns straight away and
+    wait_for_move sleeps for whatever is left of it. time and tau_flip hold
+    the last requested delay, for the simulated camera to read
+    """
+
+    def __init__(self, t0, pos_min=0.0, pos_max=610.0, offset_mm=0.0, velocity=30.0, settle_time=0.05):
+        self.t0 = t0
+        self.pos_min = pos_min
+        self.pos_max = pos_max
+        self.offset_mm = offset_mm  # stage position at time zero relative to t0
+        self.velocity = velocity  # mm/s
+        self.settle_time = settle_time  # s
+        self.pos = pos_min
+        self.move_end = time.perf_counter()
+        self.time = self.t0-self.convert_mm_to_ps(self.pos)
+        self.tau_flip = False
+        self.set_max_min_times()
+
+    def initialise(self):
+        self.home()
+        self.initialized = True
+
+    def home(self):
+        self.start_move(self.t0-self.convert_mm_to_ps(self.pos_min))
+        self.wait_for_move()
+        return
+
+    def move_to(self, time_point_ps):
+        tau_flip_request = self.start_move(time_point_ps)
+        self.wait_for_move()
+        return tau_flip_request
+
+    def start_move(self, time_point_ps):
+        new_pos_mm = self.convert_ps_to_mm(float(self.t0-time_point_ps))
+        travel = abs(new_pos_mm-self.pos)/self.velocity
+        self.move_end = max(self.move_end, time.perf_counter())+travel+self.settle_time
+        self.pos = new_pos_mm
+        self.time = time_point_ps
+        self.tau_flip = True  # since chopper REF signal is out of phase
+        return self.tau_flip
+
+    def wait_for_move(self):
+        remaining = self.move_end-time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return
+
+    def convert_ps_to_mm(self, time_ps):
+        pos_mm = (0.299792458*time_ps/2)+self.offset_mm
+        return pos_mm
+
+    def convert_mm_to_ps(self, pos_mm):
+        time_ps = 2*(pos_mm-self.offset_mm)/0.299792458
+        return time_ps
+
+    def set_max_min_times(self):
+        self.tmax = self.convert_mm_to_ps(self.pos_min)+self.t0
+        self.tmin = -self.convert_mm_to_ps(self.pos_max)+self.t0
+
+    def close(self):
+        return
+
+    def check_times(self, times):
+        all_on_stage = True
+        for time_point in times:
+            if not self.check_time(time_point):
+                all_on_stage = False
+        return all_on_stage
+
+    def check_time(self, time_point):
+        pos = self.convert_ps_to_mm(float(self.t0-time_point))
+        return (pos >= self.pos_min) and (pos <= self.pos_max)
+
+
+class SimulatedPILongStageDelay(SimulatedStageDelay):
+
+    def __init__(self, t0, velocity=30.0, settle_time=0.05):
+        super(SimulatedPILongStageDelay, self).__init__(t0, pos_min=0.0, pos_max=610.0, offset_mm=0.0, velocity=velocity, settle_time=settle_time)
+
+
+class SimulatedPIShortStageDelay(SimulatedStageDelay):
+
+    def __init__(self, t0, velocity=3.0, settle_time=0.05):
+        super(SimulatedPIShortStageDelay, self).__init__(t0, pos_min=-13.0, pos_max=13.0, offset_mm=-13.0, velocity=velocity, settle_time=settle_time)
+
+
+class SimulatedInnolasPinkLaserDelay:
+    """
+    stands in for the delay generator of the pink laser. negative delays are
+    made by delaying the pump by one laser period less the delay, so the pump
+    lands on the shot after the trigger and move_to asks for a tau flip.
+    new delays apply after settle_time, the time to reprogram the generator
+    """
+
+    def __init__(self, t0, rep_rate=1000, settle_time=0.0):
+        self.t0 = t0
+        self.rep_rate = rep_rate  # Hz
+        self.settle_time = settle_time  # s
+        self.dg_delay = 0.0  # delay of channel AB from T0, s
+        self.move_end = time.perf_counter()
+        self.time = self.t0
+        self.tau_flip = False
+        self.set_max_min_times()
+
+    def initialise(self):
+        self.dg_delay = 0.0
+        self.initialized = True
+
+    def move_to(self, time_point_ns):
+        tau_flip_request = False
+        new_time = (self.t0-time_point_ns)*1E-9
+        if new_time < 0:
+            tau_flip_request = True
+            new_time = new_time+1/self.rep_rate
+        self.dg_delay = new_time
+        self.move_end = time.perf_counter()+self.settle_time
+        self.time = time_point_ns
+        self.tau_flip = tau_flip_request
+        return tau_flip_request
+
+    def start_move(self, time_point_ns):
+        return self.move_to(time_point_ns)
+
+    def wait_for_move(self):
+        remaining = self.move_end-time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        return
+
+    def set_max_min_times(self):
+        self.tmax = 1E9/self.rep_rate+self.t0
+        self.tmin = -1E9/self.rep_rate+self.t0
+
+    def close(self):
+        return
+
+    def check_times(self, times):
+        all_between_two_shots = True
+        for time_point in times:
+            if not self.check_time(time_point):
+                all_between_two_shots = False
+        return all_between_two_shots
+
+    def check_time(self, time_point):
+        new_time = (self.t0-time_point)*1E-9
+        return (new_time >= -1/self.rep_rate) and (new_time <= 1/self.rep_rate)
@@ -1,40 +1,105 @@
 import numpy as np
 import os
+import queue
+import threading
 import h5py
 import datetime as dt
 
 class SweepProcessing:
-    def __init__(self,times,num_pixels,filename,metadata):
+    def __init__(self,times,num_pixels,filename,metadata,compression=None,waves=None,new_file=True,swmr=False):
         self.filename= filename.split('.')[0]
         self.hdf5_filename = self.filename+'.hdf5'
         i = 1
-        while os.path.isfile(self.hdf5_filename) is True:
+        while (new_file is True) and (os.path.isfile(self.hdf5_filename) is True):
             self.hdf5_filename = self.filename+'_'+str(i)+'.hdf5'
             i += 1
         
         self.metadata = metadata
+        self.compression = compression  # e.g. 'gzip' or 'lzf' for the per sweep datasets, None to store them uncompressed
+        self.hdf5_file = None
+        self.swmr = swmr  # single writer multiple reader, other processes can read the file while the run goes on
+        self.last_saved_sweep = None
+        self.write_queue = None
+        self.writer = None
+        self.on_write_error = None
+        self.late_metadata = {}
         
         self.sweep_index = 0
         self.times = np.array(times,ndmin=2)
         self.sweep_index_array = np.zeros(shape=(self.times.size,1))
         self.pixels = np.linspace(0,num_pixels-1,num_pixels)
+        self.waves = self.pixels if waves is None else np.array(waves)
         self.current_data = np.zeros(shape=(self.times.size,num_pixels))
         self.avg_data = np.zeros(shape=(self.times.size,num_pixels))
+        self.m2_data = np.zeros(shape=(self.times.size,num_pixels))  # Welford sum of squared deviations from avg_data, sweep_index_array holds the counts
+        self.measured = np.zeros(self.times.size,dtype=bool)  # time points of the current sweep added so far, a retake can come in after later points
         
     def add_current_data(self,dtt,time_point):
         self.current_data[time_point,:] = dtt
-        if self.sweep_index == 0:
-            self.avg_data[time_point,:] = dtt
-        else:
-            self.avg_data[time_point,:] = np.array(((self.avg_data[time_point,:]*self.sweep_index_array[time_point])+dtt)/(self.sweep_index_array[time_point]+1))
+        self.measured[time_point] = True
         self.sweep_index_array[time_point] = self.sweep_index_array[time_point]+1 
+        delta = dtt-self.avg_data[time_point,:]
+        self.avg_data[time_point,:] += delta/self.sweep_index_array[time_point]
+        self.m2_data[time_point,:] += delta*(dtt-self.avg_data[time_point,:])
         return
+        
+    def avg_error(self,time_point=slice(None)):
+        """
+        standard error of avg_data across sweeps, for one time point or all
+        of them. nan until a time point has two sweeps
+        """
+        count = self.sweep_index_array[time_point]
+        with np.errstate(divide='ignore',invalid='ignore'):
+            variance = self.m2_data[time_point]/(count-1)
+            return np.where(count > 1,np.sqrt(np.maximum(variance,0)/count),np.nan)
             
     def next_sweep(self):
         self.sweep_index = self.sweep_index+1
         self.current_data = np.zeros(shape=(self.times.size,self.pixels.size))
+        self.measured = np.zeros(self.times.size,dtype=bool)
         return
         
+    def run_position(self):
+        """
+        next sweep and timestep to measure: the first time point of the current
+        sweep not added yet, or the start of the next sweep once all of them are
+        """
+        if self.measured.all():
+            return [self.sweep_index+1,0]
+        return [self.sweep_index,int(np.argmin(self.measured))]
+        
+    @classmethod
+    def resume(cls,hdf5_filename,compression=None,swmr=False):
+        """
+        rebuilds the sweeps of an interrupted run from the points and run
+        state saved in its file. returns them with the timestep to carry on
+        from, new points are added to the same file. measured marks the time
+        points of that sweep already in the file, which are not measured again
+        """
+        with h5py.File(hdf5_filename,'r') as hdf5_file:
+            times = np.array(hdf5_file['Times'])
+            waves = np.array(hdf5_file['Wavelengths'])
+            metadata = {key: value.decode('ascii') if isinstance(value,bytes) else str(value) for key, value in hdf5_file['Metadata'].attrs.items()}
+            sweep_index, timestep = [int(i) for i in hdf5_file['Run_Position']]
+            sweep_index_array = np.array(hdf5_file['Run_State'])
+            avg_data = np.array(hdf5_file['Average'])[1:,1:]
+            m2_data = np.array(hdf5_file['Average_M2'])
+            current_data = np.zeros(shape=(times.size,waves.size))
+            measured = np.zeros(times.size,dtype=bool)
+            if hdf5_file['Sweeps'].shape[0] > sweep_index:
+                sweep = np.array(hdf5_file['Sweeps'][sweep_index])
+                measured = ~np.all(np.isnan(sweep),axis=1)  # rows not measured yet are all nan
+                current_data = np.nan_to_num(sweep)
+        sweeps = cls(times,waves.size,hdf5_filename,metadata,compression=compression,waves=waves,new_file=False,swmr=swmr)
+        sweeps.hdf5_filename = hdf5_filename
+        sweeps.sweep_index = sweep_index
+        sweeps.sweep_index_array = sweep_index_array
+        sweeps.avg_data = avg_data
+        sweeps.m2_data = m2_data
+        sweeps.current_data = current_data
+        sweeps.measured = measured
+        return sweeps, timestep
+        
 #    def save_current_data_old(self,waves):
 #        basename = os.path.basename(self.filename)
 #        pathname= os.path.dirname(self.filename)
@@ -47,16 +112,205 @@ class SweepProcessing:
 #                                           self.current_data))))
 #        np.savetxt(new_filename,save_data,newline='\r\n',delimiter='\t',fmt='%1.4e')
         
-    def save_current_data(self,waves):
-        save_data = np.vstack((np.hstack((0,waves)),
-                               np.hstack((self.times.T,
-                                          self.current_data))))
+    def open_file(self):
+        """
+        the file is opened on the first save and held open for the whole run, close() it when finished.
+        in swmr mode every dataset is made up front, nothing can be added once readers may be attached
+        """
+        if self.hdf5_file is None:
+            if self.swmr is True:
+                self.hdf5_file = h5py.File(self.hdf5_filename,'a',libver='latest')
+                self.create_datasets(self.waves)
+                self.create_spectra_datasets(self.pixels.size)
+                if 'Average' not in self.hdf5_file:
+                    self.save_avg_data(self.waves,np.zeros(self.current_data.shape),self.sweep_index)
+                if 'AverageError' not in self.hdf5_file:
+                    self.save_avg_error(self.waves,self.avg_error())
+                try:
+                    self.hdf5_file.swmr_mode = True
+                except RuntimeError:
+                    self.swmr = False  # resuming a file written before swmr, carry on without it
+            else:
+                self.hdf5_file = h5py.File(self.hdf5_filename,'a')
+        return self.hdf5_file
+    
+    def close(self):
+        """
+        flushes any sweeps still queued for the writer, then closes the file
+        """
+        if self.writer is not None:
+            self.write_queue.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.hdf5_file is not None:
+            self.hdf5_file.close()
+            self.hdf5_file = None
+            end_attrs = (self.swmr is True) and (self.last_saved_sweep is not None)
+            if (end_attrs is True) or (len(self.late_metadata) > 0):
+                with h5py.File(self.hdf5_filename,'a') as hdf5_file:  # attributes cannot change in swmr mode
+                    if end_attrs is True:
+                        self.set_end_attrs(hdf5_file['Average'],self.last_saved_sweep)
+                    self.save_late_metadata(hdf5_file)
+        return
+        
+    def add_metadata(self,key,item):
+        """
+        metadata only known once the run is going, e.g. the precision check of
+        its first point. written to the file when it is closed
+        """
+        self.metadata = dict(self.metadata)
+        self.metadata[key] = item
+        self.late_metadata[key] = item
+        return
+        
+    def save_late_metadata(self,hdf5_file):
+        for name in ('Metadata','Average'):
+            if name in hdf5_file:
+                for key,item in self.late_metadata.items():
+                    hdf5_file[name].attrs[key] = str(item).encode('ascii','ignore')
+        return
+        
+    def start_writer(self,on_write_error=None,max_pending=4):
+        """
+        saves sweeps from a background thread from now on. save_sweep blocks
+        only when max_pending sweeps are already waiting. on_write_error is
+        called from the writer thread with a message if a save fails
+        """
+        self.on_write_error = on_write_error
+        self.write_queue = queue.Queue(maxsize=max_pending)
+        self.writer = threading.Thread(target=self.write_loop,daemon=True)
+        self.writer.start()
+        return
+        
+    def write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                break
+            write, snapshot = item
+            write(snapshot)
+        return
+        
+    def submit(self,write,snapshot):
+        if self.writer is None:
+            write(snapshot)
+        else:
+            self.write_queue.put((write,snapshot))
+        return
+        
+    def save_point(self,time_point):
+        """
+        saves the point just added, and the run state, through the writer if
+        it is running. a crash then loses at most the point being measured
+        """
+        snapshot = {'sweep_index': self.sweep_index,
+                    'time_point': time_point,
+                    'dtt': np.array(self.current_data[time_point,:]),
+                    'avg_dtt': np.array(self.avg_data[time_point,:]),
+                    'm2': np.array(self.m2_data[time_point,:]),
+                    'avg_error': self.avg_error(time_point),
+                    'sweep_index_array': np.array(self.sweep_index_array),
+                    'run_position': self.run_position()}
+        self.submit(self.write_point,snapshot)
+        return
+        
+    def write_point(self,snapshot):
+        try:
+            hdf5_file = self.create_datasets(self.waves)
+            sweep_index, time_point = snapshot['sweep_index'], snapshot['time_point']
+            if 'Average' not in hdf5_file:
+                self.save_avg_data(self.waves,np.zeros(self.current_data.shape),sweep_index)
+            if 'AverageError' not in hdf5_file:
+                self.save_avg_error(self.waves,np.full(self.current_data.shape,np.nan))
+            dset = hdf5_file['Sweeps']
+            if dset.shape[0] < sweep_index+1:
+                dset.resize(sweep_index+1,axis=0)
+            dset[sweep_index,time_point,:] = snapshot['dtt']
+            hdf5_file['Average'][time_point+1,1:] = snapshot['avg_dtt']
+            hdf5_file['AverageError'][time_point+1,1:] = snapshot['avg_error']
+            hdf5_file['Average_M2'][time_point,:] = snapshot['m2']
+            hdf5_file['Run_State'][:,:] = snapshot['sweep_index_array']
+            hdf5_file['Run_Position'][:] = snapshot['run_position']
+            hdf5_file.flush()
+        except Exception as exception:
+            if self.on_write_error is None:
+                raise
+            self.on_write_error('Error saving sweep '+str(snapshot['sweep_index'])+' point '+str(snapshot['time_point'])+': '+str(exception))
+        return
+        
+    def save_sweep(self,waves,probe,reference,error):
+        """
+        saves the current sweep with the spectra of its last point, through
+        the writer if it is running. the arrays are copied, so the sweep can
+        carry on straight away
+        """
+        snapshot = {'sweep_index': self.sweep_index,
+                    'waves': np.array(waves),
+                    'current_data': np.array(self.current_data),
+                    'avg_data': np.array(self.avg_data),
+                    'm2_data': np.array(self.m2_data),
+                    'sweep_index_array': np.array(self.sweep_index_array),
+                    'avg_error': self.avg_error(),
+                    'probe': np.array(probe),
+                    'reference': np.array(reference),
+                    'error': np.array(error)}
+        self.submit(self.write_sweep,snapshot)
+        return
         
-        with h5py.File(self.hdf5_filename) as hdf5_file:
-            dset = hdf5_file.create_dataset('Sweeps/Sweep_'+str(self.sweep_index),data=save_data)
-            dset.attrs['date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
-            dset.attrs['time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
-                 
+    def write_sweep(self,snapshot):
+        try:
+            self.save_current_data(snapshot['waves'],snapshot['current_data'],snapshot['sweep_index'])
+            self.save_avg_data(snapshot['waves'],snapshot['avg_data'],snapshot['sweep_index'])
+            self.save_avg_error(snapshot['waves'],snapshot['avg_error'])
+            self.save_m2(snapshot['m2_data'],snapshot['sweep_index_array'])
+            self.save_metadata_each_sweep(snapshot['probe'],snapshot['reference'],snapshot['error'],snapshot['sweep_index'])
+        except Exception as exception:
+            if self.on_write_error is None:
+                raise
+            self.on_write_error('Error saving sweep '+str(snapshot['sweep_index'])+': '+str(exception))
+        return
+        
+    def create_sweep_dataset(self,name,shape,dtype=float,fillvalue=None):
+        """
+        empty dataset that grows by one sweep along axis 0, one chunk per sweep
+        so saving a sweep costs the same however long the run gets
+        """
+        return self.hdf5_file.create_dataset(name,shape=(0,)+shape,maxshape=(None,)+shape,chunks=(1,)+shape,dtype=dtype,compression=self.compression,fillvalue=fillvalue)
+        
+    def create_datasets(self,waves):
+        """
+        axes, sweeps, the Welford M2 of the average and run state, made by whichever save comes first.
+        points not measured yet read as nan in Sweeps
+        """
+        hdf5_file = self.open_file()
+        if 'Sweeps' not in hdf5_file:
+            hdf5_file.create_dataset('Times',data=self.times[0,:])
+            hdf5_file.create_dataset('Wavelengths',data=waves)
+            self.create_sweep_dataset('Sweeps',self.current_data.shape,fillvalue=np.nan)
+            self.create_sweep_dataset('Sweep_Timestamps',(),dtype='S26')
+            hdf5_file.create_dataset('Average_M2',data=self.m2_data)
+            hdf5_file.create_dataset('Run_State',data=self.sweep_index_array)
+            hdf5_file.create_dataset('Run_Position',data=self.run_position())  # next sweep and timestep to measure
+        return hdf5_file
+        
+    def create_spectra_datasets(self,num_pixels):
+        if 'Spectra' not in self.hdf5_file:
+            self.create_sweep_dataset('Spectra/Probe',(num_pixels,))
+            self.create_sweep_dataset('Spectra/Reference',(num_pixels,))
+            self.create_sweep_dataset('Spectra/Error',(num_pixels,))
+        return
+        
+    def append_sweep(self,name,data,sweep_index):
+        dset = self.hdf5_file[name]
+        dset.resize(sweep_index+1,axis=0)
+        dset[sweep_index] = data
+        return dset
+        
+    def save_current_data(self,waves,current_data,sweep_index):
+        hdf5_file = self.create_datasets(waves)
+        self.append_sweep('Sweeps',current_data,sweep_index)
+        self.append_sweep('Sweep_Timestamps',str(dt.datetime.now()).encode('ascii','ignore'),sweep_index)
+        hdf5_file.flush()
         return
         
 #    def save_avg_data_old(self,waves):
@@ -66,47 +320,72 @@ class SweepProcessing:
 #        
 #        np.savetxt(self.filename,save_data,newline='\r\n',delimiter='\t',fmt='%1.4e')
         
-    def save_avg_data(self,waves):
+    def save_avg_data(self,waves,avg_data,sweep_index):
         save_data = np.vstack((np.hstack((0,waves)),
                                np.hstack((self.times.T,
-                                          self.avg_data))))
-        
-        with h5py.File(self.hdf5_filename) as hdf5_file:
-            try:
-                dset = hdf5_file['Average']
-                dset[:,:] = save_data
-                dset.attrs.modify('end_date',str(dt.datetime.now().date()).encode('ascii','ignore'))
-                dset.attrs.modify('end_time',str(dt.datetime.now().time()).encode('ascii','ignore'))
-                dset.attrs.modify('num_sweeps',str(self.sweep_index).encode('ascii','ignore'))
-            except:
-                self.save_metadata_initial()
-                dset = hdf5_file.create_dataset('Average',data=save_data)
-                dset.attrs['start date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
-                dset.attrs['start time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
-                for key,item in self.metadata.items():
-                    dset.attrs[key] = str(item).encode('ascii','ignore')
-                dset.attrs['num_sweeps'] = str(self.sweep_index).encode('ascii','ignore')
+                                          avg_data))))
+        
+        hdf5_file = self.open_file()
+        try:
+            dset = hdf5_file['Average']
+            dset[:,:] = save_data
+            self.last_saved_sweep = sweep_index
+            if hdf5_file.swmr_mode is False:
+                self.set_end_attrs(dset,sweep_index)
+        except:
+            self.save_metadata_initial()
+            dset = hdf5_file.create_dataset('Average',data=save_data)
+            dset.attrs['start date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
+            dset.attrs['start time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
+            for key,item in self.metadata.items():
+                dset.attrs[key] = str(item).encode('ascii','ignore')
+            dset.attrs['num_sweeps'] = str(sweep_index).encode('ascii','ignore')
+        hdf5_file.flush()
+        return
+        
+    def save_avg_error(self,waves,avg_error):
+        """
+        standard error of the average across sweeps, laid out like Average.
+        nan where a time point has fewer than two sweeps
+        """
+        save_data = np.vstack((np.hstack((0,waves)),
+                               np.hstack((self.times.T,
+                                          avg_error))))
+        
+        hdf5_file = self.open_file()
+        if 'AverageError' in hdf5_file:
+            hdf5_file['AverageError'][:,:] = save_data
+        else:
+            hdf5_file.create_dataset('AverageError',data=save_data)
+        hdf5_file.flush()
+        return
+        
+    def save_m2(self,m2_data,sweep_index_array):
+        hdf5_file = self.open_file()
+        hdf5_file['Average_M2'][:,:] = m2_data
+        hdf5_file['Run_State'][:,:] = sweep_index_array
+        hdf5_file.flush()
+        return
+        
+    def set_end_attrs(self,dset,sweep_index):
+        dset.attrs.modify('end_date',str(dt.datetime.now().date()).encode('ascii','ignore'))
+        dset.attrs.modify('end_time',str(dt.datetime.now().time()).encode('ascii','ignore'))
+        dset.attrs.modify('num_sweeps',str(sweep_index).encode('ascii','ignore'))
         return
         
     def save_metadata_initial(self):
-        with h5py.File(self.hdf5_filename) as hdf5_file:
-            data = np.zeros((1,1))
-            dset = hdf5_file.create_dataset('Metadata',data=data)
-            for key, item in self.metadata.items():
-                dset.attrs[key] = str(item).encode('ascii','ignore')
+        hdf5_file = self.open_file()
+        data = np.zeros((1,1))
+        dset = hdf5_file.create_dataset('Metadata',data=data)
+        for key, item in self.metadata.items():
+            dset.attrs[key] = str(item).encode('ascii','ignore')
+        return
                     
-    def save_metadata_each_sweep(self,probe,reference,error):
-        with h5py.File(self.hdf5_filename) as hdf5_file:
-            dset = hdf5_file.create_dataset('Spectra/Sweep_'+str(self.sweep_index)+'_Probe_Spectrum',data=probe)
-            dset.attrs['date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
-            dset.attrs['time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
-                
-            dset2 = hdf5_file.create_dataset('Spectra/Sweep_'+str(self.sweep_index)+'_Reference_Spectrum',data=reference)
-            dset2.attrs['date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
-            dset2.attrs['time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
-                
-            dset3 = hdf5_file.create_dataset('Spectra/Sweep_'+str(self.sweep_index)+'_Error_Spectrum',data=error)
-            dset3.attrs['date'] = str(dt.datetime.now().date()).encode('ascii','ignore')
-            dset3.attrs['time'] = str(dt.datetime.now().time()).encode('ascii','ignore')
-            
-                    
\ No newline at end of file
+    def save_metadata_each_sweep(self,probe,reference,error,sweep_index):
+        hdf5_file = self.open_file()
+        self.create_spectra_datasets(np.size(probe))
+        self.append_sweep('Spectra/Probe',probe,sweep_index)
+        self.append_sweep('Spectra/Reference',reference,sweep_index)
+        self.append_sweep('Spectra/Error',error,sweep_index)
+        hdf5_file.flush()
+        return
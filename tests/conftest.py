@@ -0,0 +1,37 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pyTA'))  # the modules of pyTA import each other by name
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    """
+    event loop for the engine, its threads and the plot widgets, one per
+    test session. widgets are drawn offscreen unless a platform is set
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5 import QtWidgets
+    app = QtWidgets.QApplication.instance()
+    if app is None:
+        app = QtWidgets.QApplication([])
+    return app
+
+
+@pytest.fixture
+def shot_block():
+    """
+    factory of raw shot blocks from the simulated NIR camera, laid out as
+    Acquisition hands them on: (probe, reference, first_pixel, num_pixels)
+    """
+    from simulation import SimulatedStresingCameras
+    def make(num_shots=200, time=5.0, tau_flip=False, blocked=False, seed=0, **kwargs):
+        camera = SimulatedStresingCameras('NIR', shot_rate=None, seed=seed, **kwargs)
+        camera.time, camera.tau_flip, camera.blocked = time, tau_flip, blocked
+        probe = np.zeros((num_shots, camera.pixels), dtype=np.int32)
+        reference = np.zeros((num_shots, camera.pixels), dtype=np.int32)
+        camera._fill(probe, reference, 0)
+        return probe, reference, camera.first_pixel, camera.num_pixels
+    return make
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import pyqtgraph.functions as fn
+from colourmap import ColourMapView
+
+
+@pytest.fixture
+def views(qapp):
+    """
+    views made by a test, closed at the end of it. left to the garbage
+    collector, pyqtgraph widgets can take the interpreter down with them
+    """
+    made = []
+    yield made
+    for view in made:
+        view.close()
+        view.deleteLater()
+    qapp.processEvents()
+
+
+def full_render(view):
+    """
+    argb of the whole image as render() makes it, to compare the patched rows against
+    """
+    item = view.imageItem
+    argb, alpha = fn.makeARGB(item.display_image(item.image), lut=item.current_lut(), levels=item.levels)
+    return argb
+
+
+def rendered_view(views, image):
+    view = ColourMapView()
+    views.append(view)
+    view.set_image(image)
+    view.imageItem.render()  # as the first paint would
+    return view
+
+
+def test_row_within_the_levels_is_patched_like_a_full_render(views):
+    rng = np.random.default_rng(0)
+    image = rng.normal(size=(6, 40))
+    image[3:] = np.nan  # not measured yet
+    view = rendered_view(views, image)
+    levels = view.current_levels
+    argb = view.imageItem.argb
+    view.set_row(4, 0.5*image[1])
+    assert view.current_levels == levels
+    assert view.imageItem.argb is argb  # patched in place, not rendered again
+    np.testing.assert_array_equal(view.imageItem.argb, full_render(view))
+
+
+def test_row_outside_the_levels_moves_them(views):
+    image = np.random.default_rng(1).normal(size=(5, 30))
+    view = rendered_view(views, image)
+    low, high = view.current_levels
+    view.set_row(2, np.full(30, 10*high))
+    assert view.current_levels[1] > 10*high
+    assert view.imageItem.levels[1] == view.current_levels[1]
+    view.imageItem.render()
+    np.testing.assert_array_equal(view.imageItem.argb, full_render(view))
+
+
+def test_row_levels_ignore_nan(views):
+    view = ColourMapView()
+    views.append(view)
+    image = np.zeros((3, 10))
+    image[2] = np.nan
+    view.set_image(image)
+    assert view.current_levels == (-1e-12, 1e-12)
+    view.set_row(1, np.linspace(-1, 1, 10))
+    np.testing.assert_allclose(view.current_levels, (-1.1, 1.1))
@@ -0,0 +1,237 @@
+import warnings
+import numpy as np
+import pytest
+from dtt import DataProcessing, RunningStatistics, Workspace, check_precision
+import fused
+from fused import FusedProcessing
+
+THRESHOLD = [0, 15000]
+
+
+def baseline_on_off(trigger, thresh_value, tau_flip_request=False):
+    """
+    shot indices of the original separate_on_off: strict alternation, phase from the first shot
+    """
+    shots = np.arange(trigger.size)
+    if (trigger[0] >= thresh_value) != tau_flip_request:
+        return shots[::2], shots[1::2]
+    return shots[1::2], shots[::2]
+
+
+@pytest.mark.parametrize('tau_flip_request', [False, True])
+@pytest.mark.parametrize('first_high', [False, True])
+def test_pair_shots_matches_baseline_on_alternating_shots(tau_flip_request, first_high):
+    trigger = np.where((np.arange(100) % 2 == 0) == first_high, 30000, 1000)
+    chopper_state = DataProcessing.classify_shots(trigger, THRESHOLD[1], tau_flip_request)
+    on_index, off_index = DataProcessing.pair_shots(chopper_state)
+    baseline_on, baseline_off = baseline_on_off(trigger, THRESHOLD[1], tau_flip_request)
+    assert np.array_equal(np.sort(on_index), baseline_on)
+    assert np.array_equal(np.sort(off_index), baseline_off)
+
+
+def test_pair_shots_restarts_after_dropped_trigger():
+    chopper_state = np.array([1, 0, 1, 0, 0, 1, 0, 1, 1], dtype=bool)  # shot 4 repeats the state of shot 3
+    on_index, off_index = DataProcessing.pair_shots(chopper_state)
+    assert list(on_index) == [0, 2, 5, 7]
+    assert list(off_index) == [1, 3, 4, 6]  # shot 8 is left over
+    assert np.all(chopper_state[on_index]) and not np.any(chopper_state[off_index])
+
+
+def test_pair_shots_without_alternation():
+    on_index, off_index = DataProcessing.pair_shots(np.ones(10, dtype=bool))
+    assert on_index.size == 0 and off_index.size == 0
+
+
+def test_dropped_shots_are_counted(shot_block):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=400, drop_rate=0.02, seed=3)
+    data = DataProcessing(probe, reference, first_pixel, num_pixels)
+    high_std, on_index, off_index = data.find_pairs(THRESHOLD)
+    assert data.num_dropped_shots == 400-2*on_index.size
+    assert data.num_dropped_shots > 1
+    assert np.all(data.chopper_state[on_index]) and not np.any(data.chopper_state[off_index])
+    assert np.all(np.abs(on_index-off_index) == 1)
+
+
+@pytest.mark.parametrize('processing', [DataProcessing, FusedProcessing])
+def test_point_without_pairs_is_rejected(shot_block, processing):
+    probe, reference, first_pixel, num_pixels = shot_block()
+    probe[:, THRESHOLD[0]] = 30000  # trigger stuck high, so no shot has a partner
+    data = processing(probe, reference, first_pixel, num_pixels, workspace=Workspace(probe.shape[0], num_pixels))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # means of no shots
+        high_std, high_dtt = data.process(THRESHOLD, cutoff=[0, num_pixels])
+    assert high_dtt is True
+    assert data.num_pairs == 0
+    assert data.num_dropped_shots == probe.shape[0]
+    assert np.all(np.isnan(data.dtt))
+
+
+def baseline_manipulate_reference(reference_array, refman):
+    """
+    the original per-shot np.interp of manipulate_reference
+    """
+    vs, vo, ho, sc, sf = refman
+    vs = 1 if vs <= 0 else vs
+    sf = 1 if sf <= 0 else sf
+    num_pixels = reference_array.shape[1]
+    x = np.linspace(0, num_pixels-1, num_pixels)
+    new_x = ((x-sc)*sf)+sc-ho
+    return np.array([np.interp(new_x, x, spectra*vs+vo) for spectra in reference_array])
+
+
+@pytest.mark.parametrize('refman', [[1.0, 0.0, 0.0, 256.0, 1.0],  # identity
+                                    [1.1, -20.0, 3.25, 256.0, 1.02],
+                                    [0.9, 5.0, -40.5, 100.0, 1.3],  # runs off both ends of the detector
+                                    [0.0, 0.0, 700.0, 256.0, 0.0]])  # vs and sf fall back to 1, everything past the last pixel
+@pytest.mark.parametrize('use_workspace', [False, True])
+def test_manipulate_reference_matches_interp(shot_block, refman, use_workspace):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=100)
+    workspace = Workspace(probe.shape[0], num_pixels) if use_workspace else None
+    data = DataProcessing(probe, reference, first_pixel, num_pixels, workspace=workspace)
+    data.separate_on_off(THRESHOLD)
+    expected_on = baseline_manipulate_reference(data.reference_on_array, refman)
+    expected_off = baseline_manipulate_reference(data.reference_off_array, refman)
+    data.manipulate_reference(refman)
+    assert np.allclose(data.reference_on_array, expected_on, rtol=1e-12, atol=1e-9)
+    assert np.allclose(data.reference_off_array, expected_off, rtol=1e-12, atol=1e-9)
+
+
+def test_interpolation_weights_rebuilt_only_when_needed(shot_block):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=20)
+    data = DataProcessing(probe, reference, first_pixel, num_pixels)
+    data.set_refman_interp(2.5, 256, 1.1)
+    index = data.refman_index
+    data.set_refman_interp(2.5, 256, 1.1)
+    assert data.refman_index is index
+    data.set_refman_interp(-2.5, 256, 1.1)
+    assert data.refman_index is not index
+    assert np.all((data.refman_weight >= 0) & (data.refman_weight <= 1))
+    assert np.all((data.refman_index >= 0) & (data.refman_index <= num_pixels-2))
+
+
+def test_running_statistics_matches_numpy():
+    values = 1e3+np.random.RandomState(1).standard_normal((1003, 7))  # large mean, small spread
+    stats = RunningStatistics(7)
+    for start in range(0, 1003, 250):
+        stats.add(values[start:start+250])
+    stats.add(values[:0])
+    assert stats.count == 1003
+    assert np.allclose(stats.mean, values.mean(axis=0), rtol=1e-14)
+    assert np.allclose(stats.std(), values.std(axis=0), rtol=1e-10)
+
+
+def test_running_statistics_float32_blocks_accumulate_in_float64():
+    values = np.random.RandomState(2).standard_normal((600, 5)).astype(np.float32)
+    stats = RunningStatistics(5)
+    stats.add(values[:300])
+    stats.add(values[300:])
+    assert stats.mean.dtype == np.float64 and stats.m2.dtype == np.float64
+    assert np.allclose(stats.std(), values.astype(float).std(axis=0), rtol=1e-5)
+
+
+def test_running_statistics_without_shots_is_nan():
+    stats = RunningStatistics(3)
+    stats.add(np.empty((0, 3)))
+    assert np.all(np.isnan(stats.mean)) and np.all(np.isnan(stats.std()))
+
+
+@pytest.mark.parametrize('use_reference', [False, True])
+@pytest.mark.parametrize('use_avg_off_shots', [False, True])
+def test_streaming_dtt_matches_full_arrays(shot_block, use_reference, use_avg_off_shots):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=1100)  # 550 pairs, two blocks of 500 and a short one
+    full = DataProcessing(probe, reference, first_pixel, num_pixels)
+    full.separate_on_off(THRESHOLD)
+    full.average_shots()
+    full.correct_probe_with_reference()
+    full.average_refd_shots()
+    full.calcuate_dtt(use_reference=use_reference, use_avg_off_shots=use_avg_off_shots, cutoff=[0, num_pixels])
+    full.calculate_dtt_error(use_reference=use_reference, use_avg_off_shots=use_avg_off_shots)
+    streaming = DataProcessing(probe, reference, first_pixel, num_pixels)
+    streaming.separate_on_off(THRESHOLD)
+    streaming.average_shots()
+    high_dtt = streaming.calculate_dtt_streaming(use_reference=use_reference, use_avg_off_shots=use_avg_off_shots, cutoff=[0, num_pixels])
+    assert high_dtt is False
+    assert np.allclose(streaming.dtt, full.dtt, rtol=1e-9, atol=1e-12)
+    assert np.allclose(streaming.probe_shot_error, full.probe_shot_error, rtol=1e-9)
+    if use_reference is True:
+        assert np.allclose(streaming.ref_shot_error, full.ref_shot_error, rtol=1e-9)
+        assert np.allclose(streaming.dtt_error, full.dtt_error, rtol=1e-9)
+
+
+def processed(data, probe, reference, first_pixel, num_pixels, bgd=None):
+    data.update(probe, reference, first_pixel, num_pixels)
+    data.process(THRESHOLD, bgd=bgd, refman=[1.0, 0.0, 1.5, 256.0, 1.01], cutoff=[0, num_pixels])
+    return np.array(data.dtt), np.array(data.probe_shot_error), np.array(data.dtt_error)
+
+
+def test_workspace_gives_the_same_points_as_fresh_arrays(shot_block):
+    bgd_block = shot_block(num_shots=200, blocked=True, seed=1)
+    bgd = DataProcessing(*bgd_block)
+    bgd.separate_on_off(THRESHOLD)
+    bgd.average_shots()
+    first = shot_block(seed=2)
+    second = shot_block(seed=3, time=50.0)
+    data = DataProcessing(*first, workspace=Workspace(first[0].shape[0], first[3]))
+    probe_buffer = data.workspace.probe
+    for block in (first, second):
+        fresh = DataProcessing(*block)
+        assert all(np.allclose(a, b, rtol=1e-12, equal_nan=True) for a, b in zip(processed(data, *block, bgd=bgd), processed(fresh, *block, bgd=bgd)))
+    assert data.workspace.probe is probe_buffer  # nothing reallocated between points
+
+
+def test_workspace_refits_to_a_new_block_shape(shot_block):
+    block = shot_block(num_shots=100)
+    workspace = Workspace(100, block[3])
+    workspace.fit(100, block[3])
+    probe_buffer = workspace.probe
+    workspace.fit(160, block[3])
+    assert workspace.probe is not probe_buffer
+    assert workspace.probe.shape == (160, block[3]) and workspace.probe_on.shape == (80, block[3])
+    data = DataProcessing(*block, workspace=workspace)
+    larger = shot_block(num_shots=160, seed=4)
+    assert np.allclose(processed(data, *larger)[0], processed(DataProcessing(*larger), *larger)[0], rtol=1e-12)
+
+
+@pytest.mark.parametrize('processing', [DataProcessing, FusedProcessing])
+def test_float32_is_within_shot_noise(shot_block, processing):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=400)
+    absolute, relative = check_precision(probe, reference, first_pixel, num_pixels, THRESHOLD, processing_class=processing)
+    assert 0 <= relative < 1e-2
+    assert absolute < 1e-5
+
+
+@pytest.mark.skipif(fused.numba is None, reason='numba is not installed')
+@pytest.mark.parametrize('use_linear_corr', [False, True])
+@pytest.mark.parametrize('use_bgd', [False, True])
+@pytest.mark.parametrize('use_refman', [False, True])
+@pytest.mark.parametrize('use_reference', [False, True])
+@pytest.mark.parametrize('use_avg_off_shots', [False, True])
+@pytest.mark.parametrize('tau_flip_request', [False, True])
+def test_fused_kernel_matches_numpy_stages(shot_block, use_linear_corr, use_bgd, use_refman, use_reference, use_avg_off_shots, tau_flip_request):
+    probe, reference, first_pixel, num_pixels = shot_block(num_shots=600)
+    options = {'tau_flip_request': tau_flip_request,
+               'use_reference': use_reference,
+               'use_avg_off_shots': use_avg_off_shots,
+               'cutoff': [0, num_pixels],
+               'max_dtt': np.inf}
+    if use_linear_corr is True:
+        rng = np.random.default_rng(2)
+        options['linear_corr'] = (1+0.01*rng.standard_normal(num_pixels), 1+0.01*rng.standard_normal(num_pixels))
+    if use_bgd is True:
+        bgd = DataProcessing(*shot_block(num_shots=200, blocked=True, seed=1))
+        bgd.separate_on_off(THRESHOLD)
+        bgd.average_shots()
+        options['bgd'] = bgd
+    if use_refman is True:
+        options['refman'] = [1.05, -10.0, 2.5, 128.0, 1.01]
+    numpy_stages = DataProcessing(probe, reference, first_pixel, num_pixels)
+    numpy_stages.process(THRESHOLD, **options)
+    kernel = FusedProcessing(probe, reference, first_pixel, num_pixels)
+    kernel.process(THRESHOLD, **options)
+    names = ['dtt', 'probe_shot_error', 'probe_on', 'probe_off', 'reference_on', 'reference_off']
+    if use_reference is True:
+        names += ['ref_shot_error', 'dtt_error', 'refd_probe_on', 'refd_probe_off']
+    for name in names:
+        np.testing.assert_allclose(getattr(kernel, name), getattr(numpy_stages, name), rtol=1e-9, atol=1e-12, err_msg=name)
+    for kernel_std, numpy_std in zip(kernel.on_shot_std(), numpy_stages.on_shot_std()):
+        np.testing.assert_allclose(kernel_std, numpy_std, rtol=1e-9, atol=1e-9)
@@ -0,0 +1,284 @@
+import numpy as np
+import h5py
+import pytest
+from PyQt5 import QtCore
+from PyQt5.QtCore import QObject, pyqtSignal
+import fused
+from cameras import Acquisition
+from engine import JobQueue, MeasurementEngine, complete_config, prepare_job
+from processing import Processing
+from simulation import SimulatedStresingCameras, SimulatedPILongStageDelay
+from sweeps import SweepProcessing
+
+
+def simulated_run(tmp_path, num_shots=100, **config):
+    """
+    camera, delay and completed config of a short simulated run
+    """
+    camera = SimulatedStresingCameras('NIR', shot_rate=None, seed=0)
+    camera.initialise()
+    delay = SimulatedPILongStageDelay(200, velocity=1e4, settle_time=0)
+    delay.initialise()
+    camera.delay = delay
+    config.setdefault('times', [-1, 0, 1, 5, 20])
+    config.setdefault('num_sweeps', 2)
+    config = prepare_job(complete_config(dict(config, filepath=str(tmp_path/'run.hdf5'), num_shots=num_shots, simulate=True)), camera)
+    return camera, delay, config
+
+
+def run_engine(engine, camera, timeout_ms=60000, **start):
+    """
+    runs the engine to the end, returns whether it stopped by itself
+    """
+    loop = QtCore.QEventLoop()
+    finished = []
+    engine.finished.connect(finished.append)
+    engine.finished.connect(loop.quit)
+    engine.background_started.connect(lambda: setattr(camera, 'blocked', True))
+    engine.background_taken.connect(lambda: setattr(camera, 'blocked', False))
+    QtCore.QTimer.singleShot(0, lambda: engine.start(**start))
+    QtCore.QTimer.singleShot(timeout_ms, loop.quit)
+    loop.exec_()
+    assert finished, 'the run did not finish'
+    engine.wait()
+    return finished[0]
+
+
+def test_buffer_pool_hands_out_each_block_once():
+    camera = SimulatedStresingCameras('NIR', shot_rate=None, seed=0)
+    acquisition = Acquisition(camera, number_of_scans=20)
+    indices = []
+    acquisition.data_ready.connect(lambda probe, reference, first_pixel, num_pixels, index: indices.append(index))
+    acquisition.acquire()
+    acquisition.acquire()
+    assert sorted(indices) == [0, 1]
+    assert acquisition.free_buffers.empty()
+    acquisition.release_buffer(indices[0])
+    acquisition.acquire()
+    assert indices[2] == indices[0]
+
+
+class FakeProcessing(QObject):
+    settings_changed = pyqtSignal(object)
+    start_next_sweep = pyqtSignal(object, bool)
+
+
+class FakeAcquisition(QObject):
+    start_acquire = pyqtSignal()
+
+
+def stepped_engine(tmp_path, **config):
+    """
+    engine whose camera and processing thread are stood in for, so the test
+    delivers readouts and points itself, in whatever order it likes
+    """
+    camera, delay, config = simulated_run(tmp_path, **config)
+    engine = MeasurementEngine(camera, delay, config)
+    engine.processing = FakeProcessing()
+    engine.acquisition = FakeAcquisition()
+    requests, settings, sweeps_ended = [], [], []
+    engine.acquisition.start_acquire.connect(lambda: requests.append(engine.timestep))
+    engine.processing.settings_changed.connect(settings.append)
+    engine.processing.start_next_sweep.connect(lambda waves, save: sweeps_ended.append(engine.sweep_index))
+    return engine, requests, settings, sweeps_ended
+
+
+def readout(engine):
+    engine.post_readout(np.zeros((1, 1)), np.zeros((1, 1)), 0, 1, 0)
+
+
+def point(time_point, rejected=False, num_dropped_shots=0):
+    return {'time_point': time_point, 'high_std': False, 'high_dtt': rejected, 'num_dropped_shots': num_dropped_shots}
+
+
+def test_next_point_requested_at_readout(tmp_path):
+    engine, requests, settings, sweeps_ended = stepped_engine(tmp_path, times=[0, 1, 2])
+    engine.start_sweep()
+    assert requests == [0]
+    readout(engine)
+    assert requests == [0, 1]  # before point 0 is back
+    engine.post_acquire(point(0))
+    assert requests == [0, 1]  # the camera is still on point 1
+    readout(engine)
+    engine.post_acquire(point(1))
+    assert requests == [0, 1, 2]
+    readout(engine)
+    assert sweeps_ended == []  # point 2 could still be rejected
+    engine.post_acquire(point(2))
+    assert sweeps_ended == [0]
+    assert [s['time_point'] for s in settings] == [0, 1, 2]
+
+
+def test_point_back_before_its_readout(tmp_path):
+    engine, requests, settings, sweeps_ended = stepped_engine(tmp_path, times=[0, 1])
+    engine.start_sweep()
+    engine.post_acquire(point(0))  # the processing thread was quicker than the engine
+    assert requests == [0]
+    readout(engine)
+    assert requests == [0, 1]
+    engine.post_acquire(point(1))
+    assert sweeps_ended == []
+    readout(engine)
+    assert sweeps_ended == [0]
+
+
+def test_rejected_point_requeued(tmp_path):
+    engine, requests, settings, sweeps_ended = stepped_engine(tmp_path, times=[0, 1, 2])
+    engine.start_sweep()
+    readout(engine)
+    engine.post_acquire(point(0, rejected=True))
+    readout(engine)
+    assert requests == [0, 1, 0]  # the retake goes before point 2
+    engine.post_acquire(point(1))
+    readout(engine)
+    engine.post_acquire(point(0))
+    assert requests == [0, 1, 0, 2]
+    readout(engine)
+    engine.post_acquire(point(2))
+    assert sweeps_ended == [0]
+
+
+def test_dropped_shots_reported_as_message(tmp_path):
+    engine, requests, settings, sweeps_ended = stepped_engine(tmp_path, times=[0, 1])
+    messages = []
+    engine.message.connect(messages.append)
+    engine.start_sweep()
+    readout(engine)
+    engine.post_acquire(point(0, num_dropped_shots=1))  # the odd shot at the end of a block
+    engine.post_acquire(point(1, num_dropped_shots=6))
+    assert [message for message in messages if 'dropped' in message] == ['dropped 6 shots']
+
+
+def test_resumed_sweep_skips_measured_points(tmp_path):
+    engine, requests, settings, sweeps_ended = stepped_engine(tmp_path, times=[0, 1, 2, 3])
+    engine.start_sweep(1, measured=np.array([True, False, True, False]))
+    readout(engine)
+    assert requests == [1, 3]
+
+
+def test_rejected_point_is_retaken(qapp, tmp_path):
+    camera, delay, config = simulated_run(tmp_path, num_sweeps=1)
+    blocks = []
+    def dtt(time, num_pixels):
+        blocks.append(time)
+        if len(blocks) == 3:
+            return np.full(num_pixels, 5.0)  # well above max_dtt, so the point is rejected
+        return np.zeros(num_pixels)
+    camera.dtt = dtt
+    engine = MeasurementEngine(camera, delay, config)
+    done = []
+    engine.point_done.connect(lambda point: done.append((point['timestep'], point['high_dtt'])))
+    assert run_engine(engine, camera) is False
+    rejected = [timestep for timestep, high_dtt in done if high_dtt]
+    assert len(rejected) == 1
+    assert sorted(timestep for timestep, high_dtt in done if not high_dtt) == list(range(config['times'].size))
+    with h5py.File(engine.config['filepath'], 'r') as hdf5_file:
+        assert np.all(np.isfinite(hdf5_file['Sweeps'][0]))
+        assert np.all(np.array(hdf5_file['Run_State']) == 1)
+
+
+class FakeBuffers:
+    def release_buffer(self, buffer_index):
+        return
+
+
+def test_precision_checked_on_first_point_of_float32_run(tmp_path, shot_block):
+    probe, reference, first_pixel, num_pixels = shot_block()
+    processing = Processing(FakeBuffers())
+    processing.new_run(SweepProcessing([0, 1, 2], num_pixels, str(tmp_path/'run.hdf5'), {'precision': 'float32'}))
+    messages = []
+    processing.message.connect(messages.append)
+    for time_point in range(3):
+        processing.update_settings({'threshold': [0, 15000], 'tau_flip_request': False, 'linear_corr': None, 'bgd': None,
+                                    'refman': None, 'use_reference': True, 'use_avg_off_shots': True, 'cutoff': [0, num_pixels],
+                                    'max_dtt': 1, 'dtype': np.float32, 'time_point': time_point, 'save': True})
+        processing.process(probe, reference, first_pixel, num_pixels, 0)
+    processing.close()
+    assert len(messages) == 1 and messages[0].startswith('float32 dtt deviation')
+    with h5py.File(str(tmp_path/'run.hdf5'), 'r') as hdf5_file:
+        assert hdf5_file['Metadata'].attrs['precision'] == 'float32'
+        assert float(hdf5_file['Metadata'].attrs['float32 dtt deviation / shot noise']) < 1e-2
+
+
+@pytest.mark.parametrize('use_numba', [True, False])
+def test_saved_precision_is_the_one_used(tmp_path, shot_block, monkeypatch, use_numba):
+    if (use_numba is True) and (fused.numba is None):
+        pytest.skip('numba is not installed')
+    if use_numba is False:
+        monkeypatch.setattr(fused, 'numba', None)  # the numpy fallback
+    camera, delay, config = simulated_run(tmp_path, precision='float32')
+    probe, reference, first_pixel, num_pixels = shot_block()
+    processing = Processing(FakeBuffers())
+    processing.update_settings(dict(config['processing'], tau_flip_request=False, bgd=None, time_point=None))
+    processing.process(probe, reference, first_pixel, num_pixels, 0)
+    assert np.dtype(processing.current_data.dtype).name == config['metadata']['precision']
+    if use_numba is True:
+        assert processing.current_data.workspace is None  # nor any float copy of the block
+        assert not hasattr(processing.current_data, 'probe_array')
+    else:
+        assert processing.current_data.probe_array.dtype.name == config['metadata']['precision']
+    assert config['metadata']['precision'] == ('float64' if use_numba else 'float32')
+
+
+def test_complete_config_leaves_the_defaults_alone(tmp_path):
+    defaults = {'num_sweeps': 3, 'metadata': {'sample': 'a'}}
+    config = complete_config({'times': [0, 1], 'filepath': str(tmp_path/'a.hdf5')}, defaults)
+    config['metadata']['sample'] = 'b'
+    assert defaults == {'num_sweeps': 3, 'metadata': {'sample': 'a'}}
+    config = complete_config({'times': [0, 1], 'filepath': str(tmp_path/'b.hdf5')})
+    assert (config['num_sweeps'], config['metadata']) == (1, {})
+
+
+def test_wait_returns_for_an_engine_that_never_ran(tmp_path):
+    camera, delay, config = simulated_run(tmp_path)
+    MeasurementEngine(camera, delay, config).wait()
+
+
+def test_job_queue_sets_the_beams_outside_the_acquisition(qapp, tmp_path):
+    camera = SimulatedStresingCameras('NIR', shot_rate=None, seed=0)
+    camera.initialise()
+    jobs = [prepare_job(complete_config({'times': [0, 1], 'filepath': str(tmp_path/name), 'num_shots': 100, 'simulate': True, 't0': 200,
+                                         'threshold': [0, threshold]}), camera)
+            for name, threshold in (('a.hdf5', 15000), ('b.hdf5', 15000), ('c.hdf5', 14000))]
+    beams = []
+    def set_beams(blocked):
+        beams.append((blocked, queue.engine.in_flight, queue.engine.reading_out))  # nothing may be acquiring
+        camera.blocked = blocked
+    def connect_delay(config):
+        delay = SimulatedPILongStageDelay(200, velocity=1e4, settle_time=0)
+        delay.initialise()
+        return delay
+    queue = JobQueue(camera, jobs, connect_delay, set_beams=set_beams, status_filepath=str(tmp_path/'status.txt'))
+    queue.job_started.connect(lambda engine: setattr(camera, 'delay', engine.delay))
+    loop = QtCore.QEventLoop()
+    queue.finished.connect(loop.quit)
+    QtCore.QTimer.singleShot(0, queue.start)
+    QtCore.QTimer.singleShot(60000, loop.quit)
+    loop.exec_()
+    queue.close()
+    assert queue.status == ['done', 'done', 'done']
+    assert beams == [(True, 0, False), (False, 0, False)]*2  # the second job reuses the first background
+    with open(str(tmp_path/'status.txt')) as status_file:
+        lines = status_file.read().splitlines()
+    assert lines == queue.progress()
+    assert all(('done' in line) and ('2/2 points' in line) for line in lines)
+
+
+def test_failed_point_releases_its_buffer_and_stops_the_run(qapp, tmp_path, monkeypatch):
+    camera, delay, config = simulated_run(tmp_path, num_sweeps=1)
+    process = fused.FusedProcessing.process
+    calls = []
+    def failing_process(self, *args, **kwargs):
+        calls.append(None)
+        if len(calls) == 3:
+            raise ValueError('broken block')
+        return process(self, *args, **kwargs)
+    monkeypatch.setattr(fused.FusedProcessing, 'process', failing_process)
+    engine = MeasurementEngine(camera, delay, config)
+    messages, done = [], []
+    engine.message.connect(messages.append)
+    engine.point_done.connect(done.append)
+    assert run_engine(engine, camera, timeout_ms=30000) is True  # stopped, rather than waiting for a buffer forever
+    assert "Error processing point: ValueError('broken block')" in messages
+    assert 2 <= len(done) < config['times'].size  # blocks read out before the failure still come back, none after it
+    assert engine.acquisition.free_buffers.qsize() == 2  # every block went back to the camera
@@ -0,0 +1,39 @@
+from history import HistoryLog
+
+
+class FakeBox:
+    def __init__(self):
+        self.text = []
+
+    def setMaximumBlockCount(self, max_lines):
+        return
+
+    def appendPlainText(self, text):
+        self.text.append(text)
+
+
+def logged(filepath):
+    with open(filepath) as log_file:
+        return [line.split(' ', 2)[2].rstrip('\n') for line in log_file]  # after the date and time
+
+
+def test_messages_before_the_file_opens_are_logged(tmp_path):
+    box = FakeBox()
+    history = HistoryLog([box], max_lines=3)
+    history.append('Connecting to long delay stage')
+    history.start_run()
+    for message in ('Launching Run!', 'Taking Background', 'Acquiring 1000 shots'):
+        history.append(message)
+    history.open_file(str(tmp_path/'run.hdf5'))
+    history.append('Starting Sweep 0')
+    history.close_file()
+    history.append('Finished')
+    history.flush()
+    assert logged(str(tmp_path/'run.log')) == ['Launching Run!', 'Taking Background', 'Acquiring 1000 shots', 'Starting Sweep 0']
+    assert box.text == ['Acquiring 1000 shots\nStarting Sweep 0\nFinished']  # the boxes keep max_lines too
+    history.append('Diagnostics on')
+    history.start_run()
+    history.append('Launching Run!')
+    history.open_file(str(tmp_path/'next.hdf5'))
+    history.close_file()
+    assert logged(str(tmp_path/'next.log')) == ['Launching Run!']  # nothing from between the runs
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from plotting import NearestIndex
+
+
+def baseline_nearest(axis, value):
+    """
+    the marker lookup NearestIndex replaced, with nan entries left out
+    """
+    distance = (np.asarray(axis, dtype=float)-value)**2
+    return np.where(distance == np.nanmin(distance))[0][0]
+
+
+AXES = {'increasing': np.linspace(400, 800, 101),
+        'decreasing': np.linspace(800, 400, 101),  # a calibration with negative slope
+        'unsorted': np.random.default_rng(0).permutation(np.linspace(-1, 100, 50)),
+        'nan': np.concatenate((np.linspace(-1, 5, 20), [np.nan], np.linspace(6, 20, 10), [np.nan])),
+        'repeated': np.array([-1, 0, 0, 0.5, 1, 1, 1, 2, 5, 5, 20], dtype=float)}
+
+
+@pytest.mark.parametrize('name', sorted(AXES))
+def test_nearest_index_matches_baseline(name):
+    axis = AXES[name]
+    nearest = NearestIndex(axis)
+    finite = axis[np.isfinite(axis)]
+    midpoints = (np.sort(finite)[1:]+np.sort(finite)[:-1])/2  # ties between neighbours
+    values = np.concatenate((finite, midpoints, np.random.default_rng(1).uniform(finite.min()-10, finite.max()+10, 200)))
+    for value in values:
+        assert nearest(value) == baseline_nearest(axis, value), value
+
+
+def test_nearest_index_outside_the_axis():
+    nearest = NearestIndex([3, np.nan, 1, 2])
+    assert nearest(-100) == 2
+    assert nearest(100) == 0
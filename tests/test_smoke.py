@@ -0,0 +1,23 @@
+import os
+import sys
+import json
+import subprocess
+import h5py
+
+ENGINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pyTA', 'engine.py')
+
+
+def test_headless_simulated_run_exits(tmp_path):
+    """
+    a whole job file through engine.main in a fresh interpreter, with
+    numba left to pick its own threading layer
+    """
+    config = {'times': [-1, 0, 0.5, 1], 'filepath': str(tmp_path/'run.hdf5'), 'num_sweeps': 2, 'num_shots': 200, 't0': 200, 'simulate': True}
+    with open(str(tmp_path/'run.json'), 'w') as config_file:
+        json.dump(config, config_file)
+    env = {key: value for key, value in os.environ.items() if key != 'NUMBA_THREADING_LAYER'}
+    result = subprocess.run([sys.executable, ENGINE, str(tmp_path/'run.json')], env=env, cwd=str(tmp_path),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=240)
+    assert result.returncode == 0, result.stderr.decode(errors='replace')
+    with h5py.File(str(tmp_path/'run.hdf5'), 'r') as hdf5_file:
+        assert hdf5_file['Sweeps'].shape == (2, 4, hdf5_file['Wavelengths'].size)
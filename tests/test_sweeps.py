@@ -0,0 +1,124 @@
+import numpy as np
+import h5py
+import pytest
+from sweeps import SweepProcessing
+
+TIMES = [-1, 0, 1, 5]
+NUM_PIXELS = 8
+
+
+def measure(sweeps, rng, num_sweeps, save=True):
+    """
+    adds num_sweeps sweeps of random dtt to sweeps, saving each one,
+    returns the dtt as (sweep x time x pixel)
+    """
+    data = rng.normal(scale=1e-3, size=(num_sweeps, len(TIMES), NUM_PIXELS))
+    for sweep in data:
+        for time_point, dtt in enumerate(sweep):
+            sweeps.add_current_data(dtt, time_point)
+        if save is True:
+            sweeps.save_sweep(sweeps.waves, sweep[-1], 2*sweep[-1], 3*sweep[-1])
+        sweeps.next_sweep()
+    return data
+
+
+@pytest.mark.parametrize('swmr', [False, True])
+def test_sweeps_grow_by_one_chunk_per_sweep(tmp_path, swmr):
+    sweeps = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'run.hdf5'), {'num shots': 100}, compression='gzip', swmr=swmr)
+    data = measure(sweeps, np.random.default_rng(0), 1)
+    handle = sweeps.hdf5_file
+    data = np.concatenate((data, measure(sweeps, np.random.default_rng(1), 2)))
+    assert sweeps.hdf5_file is handle  # held open for the whole run
+    sweeps.close()
+    assert sweeps.hdf5_file is None
+    with h5py.File(str(tmp_path/'run.hdf5'), 'r') as hdf5_file:
+        dset = hdf5_file['Sweeps']
+        assert dset.shape == (3, len(TIMES), NUM_PIXELS)
+        assert dset.maxshape == (None, len(TIMES), NUM_PIXELS)
+        assert dset.chunks == (1, len(TIMES), NUM_PIXELS)
+        assert dset.compression == 'gzip'
+        np.testing.assert_array_equal(dset[:, 1, :], data[:, 1, :])  # across sweeps in one read
+        np.testing.assert_array_equal(hdf5_file['Times'], TIMES)
+        np.testing.assert_array_equal(hdf5_file['Wavelengths'], np.arange(NUM_PIXELS))
+        assert hdf5_file['Sweep_Timestamps'].shape == (3,)
+        for name, factor in (('Probe', 1), ('Reference', 2), ('Error', 3)):
+            assert hdf5_file['Spectra/'+name].shape == (3, NUM_PIXELS)
+            np.testing.assert_array_equal(hdf5_file['Spectra/'+name], factor*data[:, -1, :])
+        np.testing.assert_allclose(hdf5_file['Average'][1:, 1:], data.mean(axis=0))
+        assert hdf5_file['Metadata'].attrs['num shots'] == '100'
+
+
+def test_writer_thread_saves_the_same_file(tmp_path):
+    direct = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'direct.hdf5'), {})
+    threaded = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'threaded.hdf5'), {})
+    threaded.start_writer()
+    for sweeps in (direct, threaded):
+        measure(sweeps, np.random.default_rng(0), 3)
+        sweeps.close()
+    with h5py.File(str(tmp_path/'direct.hdf5'), 'r') as expected, h5py.File(str(tmp_path/'threaded.hdf5'), 'r') as saved:
+        for name in ('Sweeps', 'Average', 'Spectra/Probe', 'Run_State'):
+            np.testing.assert_array_equal(saved[name], expected[name])
+
+
+def measure_points(sweeps, data, time_points):
+    """
+    adds and saves the given points of the current sweep one at a time, as a run does
+    """
+    for time_point in time_points:
+        sweeps.add_current_data(data[sweeps.sweep_index, time_point], time_point)
+        sweeps.save_point(time_point)
+    return
+
+
+def test_resumed_run_saves_the_same_file(tmp_path):
+    data = np.random.default_rng(0).normal(scale=1e-3, size=(3, len(TIMES), NUM_PIXELS))
+    expected = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'expected.hdf5'), {})
+    for sweep in range(3):
+        measure_points(expected, data, range(len(TIMES)))
+        expected.next_sweep()
+    expected.close()
+
+    interrupted = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'run.hdf5'), {}, swmr=True)
+    measure_points(interrupted, data, range(len(TIMES)))
+    interrupted.next_sweep()
+    measure_points(interrupted, data, [0, 1])
+    interrupted.close()
+
+    resumed, timestep = SweepProcessing.resume(str(tmp_path/'run.hdf5'), swmr=True)
+    assert (resumed.sweep_index, timestep) == (1, 2)
+    np.testing.assert_array_equal(resumed.measured, [True, True, False, False])
+    measure_points(resumed, data, [2, 3])
+    resumed.next_sweep()
+    measure_points(resumed, data, range(len(TIMES)))
+    resumed.next_sweep()
+    resumed.close()
+    with h5py.File(str(tmp_path/'expected.hdf5'), 'r') as expected_file, h5py.File(str(tmp_path/'run.hdf5'), 'r') as hdf5_file:
+        np.testing.assert_array_equal(hdf5_file['Sweeps'], expected_file['Sweeps'])
+        np.testing.assert_array_equal(hdf5_file['Run_State'], expected_file['Run_State'])
+        np.testing.assert_array_equal(hdf5_file['Run_Position'], [3, 0])
+        np.testing.assert_allclose(hdf5_file['Average'], expected_file['Average'])
+        np.testing.assert_allclose(hdf5_file['AverageError'], expected_file['AverageError'])
+        np.testing.assert_allclose(hdf5_file['Average_M2'], expected_file['Average_M2'], atol=1e-20)
+
+
+def test_average_error_is_stable_for_small_spread(tmp_path):
+    """
+    a spread a million times smaller than the mean, which the sum of squares lost to cancellation
+    """
+    data = 1+np.random.default_rng(0).normal(scale=1e-7, size=(50, len(TIMES), NUM_PIXELS))
+    sweeps = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'run.hdf5'), {})
+    for sweep in data:
+        for time_point, dtt in enumerate(sweep):
+            sweeps.add_current_data(dtt, time_point)
+        sweeps.next_sweep()
+    np.testing.assert_allclose(sweeps.avg_data, data.mean(axis=0), rtol=1e-14)
+    np.testing.assert_allclose(sweeps.avg_error(), data.std(axis=0, ddof=1)/np.sqrt(50), rtol=1e-6)
+    np.testing.assert_allclose(sweeps.avg_error(1), data[:, 1].std(axis=0, ddof=1)/np.sqrt(50), rtol=1e-6)
+
+
+def test_average_error_needs_two_sweeps(tmp_path):
+    sweeps = SweepProcessing(TIMES, NUM_PIXELS, str(tmp_path/'run.hdf5'), {})
+    measure(sweeps, np.random.default_rng(0), 1, save=False)
+    sweeps.add_current_data(np.ones(NUM_PIXELS), 0)
+    assert np.all(np.isnan(sweeps.avg_error()[1:]))
+    assert np.all(sweeps.avg_error(0) >= 0)